@@ -1,6 +1,8 @@
 
-import objects
 import federal
+import graph
+import objects
+import rates
 
 
 # base sur le document: formules pour le calcul des retenues a la source quebec 2020
@@ -10,74 +12,90 @@ import federal
 # Etape 1 - calcul du revenu annuel
 
 
-pay_periods = 52
-remuneration_per_period = 1464.56
-line_19 = 0 # applicable if you live in a remote region or have child support.
-remaining_periods = 50
-ei_rate = 0.012 # this is for quebec
-ei_year_max = 650.4
-holiday_rate = 0.06
-CEA = 1245 # federal parameter
+def calculate(remuneration, pay_periods, remaining_periods, E, outputs=('net_pay',), **inputs):
+    """Source deductions of one employee, without printing anything.
+    The inputs are the ones of batch.calculate_batch (K1, Q, Q1, A5, A6, ei_paid, line_19, TC, pay_date),
+    outputs the names in batch.OUTPUTS to calculate; only what they need is calculated (see graph.py).
+    Returns a read-only mapping of outputs.
+    """
+    return graph.Calculation(remuneration, pay_periods, remaining_periods, E, **inputs).get(*outputs)
+
+
+def main():
+    pay_date = '2020-01-03'
+    parameters = rates.get(pay_date)
+    pay_periods = 52
+    remuneration_per_period = 1464.56
+    line_19 = 0 # applicable if you live in a remote region or have child support.
+    remaining_periods = 50
+    ei_rate = parameters.ei_rate # this is for quebec
+    ei_year_max = parameters.ei_max
+    holiday_rate = 0.06
+    CEA = parameters.federal_cea # federal parameter
+
+
 
+    deduction_employment_income = objects.DeductionForEmploymentIncome(remuneration_per_period, pay_periods)
+    print('deduction_employment_income = ', deduction_employment_income.calculate())
 
+    source_deduction_return = objects.SourceDeductionReturn(pay_periods, line_19, remaining_periods)
+    print('source_deduction_return = ', source_deduction_return.calculate())
 
-deduction_employment_income = objects.DeductionForEmploymentIncome(remuneration_per_period, pay_periods)
-print('deduction_employment_income = ', deduction_employment_income.calculate())
+    annual_income = objects.AnnualIncome(pay_periods, remuneration_per_period, 0, deduction_employment_income.calculate(), source_deduction_return.calculate(), reduction_source_deductions=0)
+    print('annual_income =', annual_income.calculate())
 
-source_deduction_return = objects.SourceDeductionReturn(pay_periods, line_19, remaining_periods)
-print('source_deduction_return = ', source_deduction_return.calculate())
+    remuneration_per_period_reduced = annual_income.calculate() / pay_periods
+    print('updated remuneration per period:', remuneration_per_period_reduced)
 
-annual_income = objects.AnnualIncome(pay_periods, remuneration_per_period, 0, deduction_employment_income.calculate(), source_deduction_return.calculate(), reduction_source_deductions=0)
-print('annual_income =', annual_income.calculate())
+    income_tax_year = objects.IncomeTaxYear(I=annual_income.calculate(), K1=0, E=15532, P=pay_periods, Q=0, Q1=0)
+    print('income_tax_year = ', income_tax_year.calculate())
 
-remuneration_per_period_reduced = annual_income.calculate() / pay_periods
-print('updated remuneration per period:', remuneration_per_period_reduced)
+    income_tax_withheld_period = objects.IncomeTaxWithheldPerPeriod(income_tax_year.calculate(), pay_periods, additional_source_deduction=0)
+    print('income_tax_withheld_period = ', income_tax_withheld_period.calculate())
 
-income_tax_year = objects.IncomeTaxYear(I=annual_income.calculate(), K1=0, E=15532, P=pay_periods, Q=0, Q1=0)
-print('income_tax_year = ', income_tax_year.calculate())
+    A5 = objects.QuebecPensionPlan(S3=remuneration_per_period, V=parameters.qpp_exemption, P=52, M=parameters.qpp_max, A5=0).calculate() * (pay_periods - remaining_periods)
+    quebec_pension_plan = objects.QuebecPensionPlan(S3=remuneration_per_period, V=parameters.qpp_exemption, P=52, M=parameters.qpp_max, A5=A5)
+    print('quebec_pension_plan = ', quebec_pension_plan.calculate())
 
-income_tax_withheld_period = objects.IncomeTaxWithheldPerPeriod(income_tax_year.calculate(), pay_periods, additional_source_deduction=0)
-print('income_tax_withheld_period = ', income_tax_withheld_period.calculate())
 
-A5 = objects.QuebecPensionPlan(S3=remuneration_per_period, V=3500, P=52, M=3146.4, A5=0).calculate() * (pay_periods - remaining_periods)
-quebec_pension_plan = objects.QuebecPensionPlan(S3=remuneration_per_period, V=3500, P=52, M=3146.4, A5=A5)
-print('quebec_pension_plan = ', quebec_pension_plan.calculate())
+    A6 = objects.QuebecParentalInsurancePlan(S4=remuneration_per_period, N=parameters.qpip_max, A6=0).calculate() * (pay_periods - remaining_periods) # RQAP paid so far
+    quebec_parental_insurance_plan = objects.QuebecParentalInsurancePlan(S4=remuneration_per_period, N=parameters.qpip_max, A6=A6)
+    print('quebec_parental_insurance_plan = ', quebec_parental_insurance_plan.calculate())
 
+    # Assurance emploi
 
-A6 = objects.QuebecParentalInsurancePlan(S4=remuneration_per_period, N=387.79, A6=0).calculate() * (pay_periods - remaining_periods) # RQAP paid so far
-quebec_parental_insurance_plan = objects.QuebecParentalInsurancePlan(S4=remuneration_per_period, N=387.79, A6=A6)
-print('quebec_parental_insurance_plan = ', quebec_parental_insurance_plan.calculate())
 
-# Assurance emploi
+    print('')
 
 
-print('')
+    T = federal.FederalTaxRate(T1=0, P=pay_periods, L=0)
+    print('federal tax rate = ', T.calculate())
 
+    annual_taxable_income = federal.AnnualTaxableIncome(P=pay_periods, I=remuneration_per_period, F=quebec_pension_plan.calculate(), F2=0, U1=0, HD=0, F1=0, L=0)
+    print('annual_taxable_income_federal = ', annual_taxable_income.calculate())
 
-T = federal.FederalTaxRate(T1=0, P=pay_periods, L=0)
-print('federal tax rate = ', T.calculate())
+    A = annual_taxable_income.calculate()
+    print('A', A)
 
-annual_taxable_income = federal.AnnualTaxableIncome(P=pay_periods, I=remuneration_per_period, F=quebec_pension_plan.calculate(), F2=0, U1=0, HD=0, F1=0, L=0)
-print('annual_taxable_income_federal = ', annual_taxable_income.calculate())
+    ei_paid_so_far = federal.EmployementInsurance(insurable_earning=remuneration_per_period, premium_rate=ei_rate, year_max=ei_year_max, paid_this_year=0).calculate() * (pay_periods - remaining_periods)
+    employement_insurance = federal.EmployementInsurance(insurable_earning=remuneration_per_period, premium_rate=ei_rate, year_max=ei_year_max, paid_this_year=ei_paid_so_far).calculate()
+    print('employement_insurance =', employement_insurance)
 
-A = annual_taxable_income.calculate()
-print('A', A)
 
-ei_paid_so_far = federal.EmployementInsurance(insurable_earning=remuneration_per_period, premium_rate=ei_rate, year_max=650.4, paid_this_year=0).calculate() * (pay_periods - remaining_periods)
-employement_insurance = federal.EmployementInsurance(insurable_earning=remuneration_per_period, premium_rate=ei_rate, year_max=650.4, paid_this_year=ei_paid_so_far).calculate()
-print('employement_insurance =', employement_insurance)
+    basic_federal_tax = federal.BasicFederalTax(A=A, K1=0, K2Q=0, K3=0, K4=0, TC=0, P=52, C=quebec_pension_plan.calculate(), AE=employement_insurance, IE=A, CEA=CEA)
+    print('basic_federal_tax = ', basic_federal_tax.calculate())
 
+    annual_payable_tax_federal = federal.AnnualPayableTaxFederal(T3=basic_federal_tax.calculate(), LCF=750) # T1
+    print('annual_payable_tax_federal = ', annual_payable_tax_federal.calculate())
 
-basic_federal_tax = federal.BasicFederalTax(R=0.205, A=A, K=2669, K1=0, K2Q=0, K3=0, K4=0, TC=0, P=52, C=quebec_pension_plan.calculate(), AE=employement_insurance, IE=A, CEA=CEA)
-print('basic_federal_tax = ', basic_federal_tax.calculate())
+    federal_tax_per_period = annual_payable_tax_federal.calculate()/pay_periods
+    print('federal retenue per pay period = ', federal_tax_per_period)
 
-annual_payable_tax_federal = federal.AnnualPayableTaxFederal(T3=basic_federal_tax.calculate(), LCF=750) # T1
-print('annual_payable_tax_federal = ', annual_payable_tax_federal.calculate())
+    print('total net pay per pay period = ', remuneration_per_period - federal_tax_per_period - quebec_parental_insurance_plan.calculate() - quebec_pension_plan.calculate() - income_tax_withheld_period.calculate() - employement_insurance)
 
-federal_tax_per_period = annual_payable_tax_federal.calculate()/pay_periods
-print('federal retenue per pay period = ', federal_tax_per_period)
+    holiday_witholding = remuneration_per_period * holiday_rate
+    print('Holiday witholding =', holiday_witholding, 'not substracted from salary, just noted')
 
-print('total net pay per pay period = ', remuneration_per_period - federal_tax_per_period - quebec_parental_insurance_plan.calculate() - quebec_pension_plan.calculate() - income_tax_withheld_period.calculate() - employement_insurance)
 
-holiday_witholding = remuneration_per_period * holiday_rate
-print('Holiday witholding =', holiday_witholding, 'not substracted from salary, just noted')
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,369 @@
+import datetime
+import itertools
+import sys
+
+import rates
+
+
+# Calcul en lot: meme chaine que app.py (Quebec + federal) pour plusieurs employes a la fois.
+# Each argument is a column (list, tuple, array.array, numpy array...) with one value per
+# employee, or a single number applied to every employee.
+
+OUTPUTS = ('deduction_employment_income', 'source_deduction_return', 'annual_income',
+           'income_tax_year', 'income_tax_withheld_period', 'quebec_pension_plan',
+           'quebec_parental_insurance_plan', 'annual_taxable_income', 'employement_insurance',
+           'basic_federal_tax', 'annual_payable_tax_federal', 'federal_tax_per_period', 'net_pay')
+# numpy (optionnel): under NUMPY_MIN_SIZE employees converting the columns costs more than the loop. Importing
+# numpy takes about 0.1 s, the time of the loop for some 30 000 employees, so a process that has not imported
+# it yet only does once its runs (pipeline chunks, simulated periods...) add up to NUMPY_IMPORT_SIZE employees.
+NUMPY_MIN_SIZE = 64
+NUMPY_IMPORT_SIZE = 30000
+_loop_size = 0 # employes des runs de NUMPY_MIN_SIZE ou plus calcules par la boucle
+# employes par passe sur les tableaux, pour garder les tableaux intermediaires petits
+NUMPY_CHUNK = 65536
+
+
+def _column(value):
+    if value is None or isinstance(value, (int, float, str, datetime.date)):
+        return itertools.repeat(value)
+    return iter(value)
+
+
+def _size(*columns):
+    sizes = set(len(column) for column in columns
+                if not (column is None or isinstance(column, (int, float, str, datetime.date))))
+    if len(sizes) > 1:
+        raise ValueError('all columns must have the same length, got %s' % sorted(sizes))
+    if not sizes:
+        return 1
+    return sizes.pop()
+
+
+def calculate_batch(remuneration, pay_periods, remaining_periods, E, K1=0, Q=0, Q1=0,
+                    A5=0, A6=0, ei_paid=0, line_19=0, TC=0, pay_date=None, F=0, U1=0):
+    """Source deductions for a whole pay run in one pass.
+
+    remuneration = Gross remuneration for the pay period
+    pay_periods = Pay periods per year (P)
+    remaining_periods = Pay periods remaining in the year, including this one
+    E, K1, Q, Q1 = see objects.IncomeTaxYear
+    A5 = QPP paid so far, A6 = QPIP paid so far, ei_paid = EI paid so far
+    line_19 = line 19 of form TP-1015.3-V
+    TC = federal total claim amount (TD1)
+    pay_date = date of the pay (see rates.get), a column when the run spans more than one year
+    F = RRSP or RPP contribution withheld for the pay period (objects.AnnualIncome contributions, added to
+        the QPP in F of federal.AnnualTaxableIncome)
+    U1 = union dues for the pay period (federal.AnnualTaxableIncome)
+
+    Returns a dict of lists keyed by OUTPUTS, one value per employee, equal to what the
+    classes in objects.py and federal.py give when chained like in app.py.
+    With numpy installed, large runs are calculated on arrays (_calculate_numpy, see NUMPY_MIN_SIZE),
+    with the same operations in the same order, so the same results.
+    """
+    global _loop_size
+    columns = (remuneration, pay_periods, remaining_periods, E, K1, Q, Q1, A5, A6, ei_paid, line_19, TC, pay_date, F, U1)
+    size = _size(*columns)
+    if size >= NUMPY_MIN_SIZE:
+        if 'numpy' in sys.modules or _loop_size + size >= NUMPY_IMPORT_SIZE:
+            try:
+                import numpy
+            except ImportError:
+                pass
+            else:
+                return _calculate_numpy(numpy, size, *columns)
+        _loop_size += size
+    return _calculate_loop(size, *columns)
+
+
+def _calculate_loop(size, remuneration, pay_periods, remaining_periods, E, K1, Q, Q1, A5, A6, ei_paid, line_19, TC,
+                    pay_date, F, U1):
+    results = dict((name, []) for name in OUTPUTS)
+    out = [results[name].append for name in OUTPUTS]
+
+    last_day = object() # jamais egal a une date de paie
+    rows = zip(_column(remuneration), _column(pay_periods), _column(remaining_periods), _column(E),
+               _column(K1), _column(Q), _column(Q1), _column(A5), _column(A6), _column(ei_paid),
+               _column(line_19), _column(TC), _column(pay_date), _column(F), _column(U1))
+    for rem, P, Pr, e, k1, q, q1, a5, a6, ei_so_far, l19, tc, day, f, u1 in itertools.islice(rows, size):
+        if day != last_day:
+            parameters = rates.get(day)
+            last_day = day
+            qpp_rate, V, M = parameters.qpp_rate, parameters.qpp_exemption, parameters.qpp_max
+            qpip_rate, N = parameters.qpip_rate, parameters.qpip_max
+            ei_rate, ei_max = parameters.ei_rate, parameters.ei_max
+            ded_rate, ded_max = parameters.employment_deduction_rate, parameters.employment_deduction_max
+            LCF, CEA, credit = parameters.federal_lcf, parameters.federal_cea, parameters.federal_credit_rate
+            abatement = parameters.quebec_abatement
+            income_tax_rate = parameters.quebec.lookup
+            federal_tax_rate = parameters.federal.lookup
+
+        # Quebec
+        dei = ded_rate * rem
+        if dei > ded_max / P:
+            dei = ded_max / P
+        sdr = (P * l19) / Pr
+        I = P * (rem - f - dei) - sdr
+        T, K_qc = income_tax_rate(I)
+        Y = (T * I) - K_qc - k1 - (0.15 * e) - (0.15 * P * q) - (0.20 * P * q1)
+        A_qc = Y / P
+
+        qpp = qpp_rate * (rem - (V / P))
+        if a5 >= M:
+            a5 = M
+        if qpp > M - a5:
+            qpp = M - a5
+
+        qpip = qpip_rate * rem
+        if a6 >= N:
+            a6 = N
+        if qpip > N - a6:
+            qpip = N - a6
+
+        # Federal
+        A = P * (rem - (qpp + f) - u1)
+        if A <= 0:
+            A = 0
+
+        ei = rem * ei_rate
+        year_max = ei_max
+        if year_max <= ei_so_far:
+            year_max = ei_so_far
+        if ei > year_max - ei_so_far:
+            ei = year_max - ei_so_far
+
+        P_C = P * qpp
+        if P_C > M:
+            P_C = M
+        P_AE = P * ei
+        if P_AE > ei_max:
+            P_AE = ei_max
+        P_IE = P * rem * qpip_rate
+        if P_IE > N:
+            P_IE = N
+        R, K = federal_tax_rate(A)
+        K4 = min(credit * A, credit * CEA)
+        K2Q = (credit * P_C) + (credit * P_AE) + (credit * P_IE)
+        T3 = (R * A) - K - credit * tc - K2Q - K4
+        if T3 < 0:
+            T3 = 0
+
+        T3_LCF = T3 - LCF
+        if T3_LCF < 0:
+            T3_LCF = 0
+        T1 = T3_LCF - abatement * T3
+        if T1 < 0:
+            T1 = 0
+        federal_tax = T1 / P
+
+        net = rem - federal_tax - qpip - qpp - A_qc - ei
+
+        for append, value in zip(out, (dei, sdr, I, Y, A_qc, qpp, qpip, A, ei, T3, T1, federal_tax, net)):
+            append(value)
+
+    return results
+
+
+def _calculate_numpy(numpy, size, remuneration, pay_periods, remaining_periods, E, K1, Q, Q1, A5, A6, ei_paid, line_19,
+                     TC, pay_date, F, U1):
+    """_calculate_loop on numpy arrays, one pass per parameter set and NUMPY_CHUNK employees: each line
+    of the loop is the same float operation on a whole column, and a tax bracket is found with
+    searchsorted like bisect_left.
+    """
+    def array(value):
+        if isinstance(value, (int, float)):
+            return float(value)
+        return numpy.asarray(value, dtype=numpy.float64)
+
+    rem, P, Pr, e, k1, q, q1, a5, a6, ei_so_far, l19, tc, f, u1 = [
+        numpy.broadcast_to(array(value), (size,)) for value in (remuneration, pay_periods, remaining_periods, E, K1, Q, Q1,
+                                                                A5, A6, ei_paid, line_19, TC, F, U1)]
+    if not (P.all() and Pr.all()):
+        raise ZeroDivisionError('pay_periods and remaining_periods must not be 0')
+    # lignes de chaque date de paie, dans l'ordre ou elles apparaissent
+    if pay_date is None or isinstance(pay_date, (str, datetime.date)):
+        groups = [(pay_date, slice(start, start + NUMPY_CHUNK)) for start in range(0, size, NUMPY_CHUNK)]
+    else:
+        by_day = {}
+        for i, day in enumerate(itertools.islice(iter(pay_date), size)):
+            by_day.setdefault(day, []).append(i)
+        groups = [(day, numpy.array(indices[start:start + NUMPY_CHUNK]))
+                  for day, indices in by_day.items() for start in range(0, len(indices), NUMPY_CHUNK)]
+    outputs = dict((name, numpy.empty(size)) for name in OUTPUTS)
+
+    for day, rows in groups:
+        parameters = rates.get(day)
+        qpp_rate, V, M = parameters.qpp_rate, parameters.qpp_exemption, parameters.qpp_max
+        qpip_rate, N = parameters.qpip_rate, parameters.qpip_max
+        ei_rate, ei_max = parameters.ei_rate, parameters.ei_max
+        ded_rate, ded_max = parameters.employment_deduction_rate, parameters.employment_deduction_max
+        LCF, CEA, credit = parameters.federal_lcf, parameters.federal_cea, parameters.federal_credit_rate
+        abatement = parameters.quebec_abatement
+        quebec, federal = parameters.quebec, parameters.federal
+        g_rem, g_P, g_Pr, g_e, g_k1, g_q, g_q1, g_a5, g_a6, g_ei_so_far, g_l19, g_tc, g_f, g_u1 = [
+            column[rows] for column in (rem, P, Pr, e, k1, q, q1, a5, a6, ei_so_far, l19, tc, f, u1)]
+
+        # Quebec
+        dei = numpy.minimum(ded_rate * g_rem, ded_max / g_P)
+        sdr = (g_P * g_l19) / g_Pr
+        I = g_P * (g_rem - g_f - dei) - sdr
+        found = numpy.minimum(numpy.searchsorted(quebec.thresholds, I), quebec.last)
+        T, K_qc = numpy.take(quebec.rates, found), numpy.take(quebec.constants, found)
+        Y = (T * I) - K_qc - g_k1 - (0.15 * g_e) - (0.15 * g_P * g_q) - (0.20 * g_P * g_q1)
+        A_qc = Y / g_P
+
+        qpp = qpp_rate * (g_rem - (V / g_P))
+        left = M - numpy.minimum(g_a5, M)
+        qpp = numpy.where(qpp > left, left, qpp)
+
+        qpip = qpip_rate * g_rem
+        left = N - numpy.minimum(g_a6, N)
+        qpip = numpy.where(qpip > left, left, qpip)
+
+        # Federal
+        A = g_P * (g_rem - (qpp + g_f) - g_u1)
+        A = numpy.where(A <= 0, 0.0, A)
+
+        ei = g_rem * ei_rate
+        left = numpy.maximum(ei_max, g_ei_so_far) - g_ei_so_far
+        ei = numpy.where(ei > left, left, ei)
+
+        P_C = numpy.minimum(g_P * qpp, M)
+        P_AE = numpy.minimum(g_P * ei, ei_max)
+        P_IE = numpy.minimum(g_P * g_rem * qpip_rate, N)
+        found = numpy.minimum(numpy.searchsorted(federal.thresholds, A), federal.last)
+        R, K = numpy.take(federal.rates, found), numpy.take(federal.constants, found)
+        K4 = numpy.minimum(credit * A, credit * CEA)
+        K2Q = (credit * P_C) + (credit * P_AE) + (credit * P_IE)
+        T3 = numpy.maximum((R * A) - K - credit * g_tc - K2Q - K4, 0.0)
+
+        T3_LCF = numpy.maximum(T3 - LCF, 0.0)
+        T1 = numpy.maximum(T3_LCF - abatement * T3, 0.0)
+        federal_tax = T1 / g_P
+
+        net = g_rem - federal_tax - qpip - qpp - A_qc - ei
+
+        for name, values in zip(OUTPUTS, (dei, sdr, I, Y, A_qc, qpp, qpip, A, ei, T3, T1, federal_tax, net)):
+            outputs[name][rows] = values
+
+    return dict((name, values.tolist()) for name, values in outputs.items())
+
+
+BONUS_OUTPUTS = ('income_tax_on_payment', 'federal_tax_on_payment', 'quebec_pension_plan',
+                 'quebec_parental_insurance_plan', 'employement_insurance', 'net_payment')
+
+
+def calculate_bonus_batch(bonus, remuneration, pay_periods, remaining_periods, E, K1=0, Q=0, Q1=0,
+                          A5=0, A6=0, ei_paid=0, line_19=0, TC=0, pay_date=None, F=0, U1=0):
+    """Deductions on a bonus, retroactive pay or other non-periodic payment for a whole run in one pass.
+
+    bonus = Non-periodic payment of each employee (B)
+    the other arguments = regular pay of the employee, as in calculate_batch
+    (A5, A6 and ei_paid are the contributions paid before this period)
+
+    The income taxes are the tax for the year with and without the payment
+    (objects.IncomeTaxOnNonPeriodicPayment and federal.FederalTaxOnNonPeriodicPayment), the
+    annual incomes I and A being the ones of calculate_batch. QPP, QPIP and EI apply to the whole
+    payment, up to what is left of each maximum after the regular pay of the period.
+    Returns a dict of lists keyed by BONUS_OUTPUTS.
+    """
+    size = _size(bonus, remuneration, pay_periods, remaining_periods, E, K1, Q, Q1, A5, A6, ei_paid, line_19, TC,
+                 pay_date, F, U1)
+    results = dict((name, []) for name in BONUS_OUTPUTS)
+    out = [results[name].append for name in BONUS_OUTPUTS]
+
+    last_day = object() # jamais egal a une date de paie
+    rows = zip(_column(bonus), _column(remuneration), _column(pay_periods), _column(remaining_periods),
+               _column(E), _column(K1), _column(Q), _column(Q1), _column(A5), _column(A6), _column(ei_paid),
+               _column(line_19), _column(TC), _column(pay_date), _column(F), _column(U1))
+    for B, rem, P, Pr, e, k1, q, q1, a5, a6, ei_so_far, l19, tc, day, f, u1 in itertools.islice(rows, size):
+        if day != last_day:
+            parameters = rates.get(day)
+            last_day = day
+            qpp_rate, V, M = parameters.qpp_rate, parameters.qpp_exemption, parameters.qpp_max
+            qpip_rate, N = parameters.qpip_rate, parameters.qpip_max
+            ei_rate, ei_max = parameters.ei_rate, parameters.ei_max
+            ded_rate, ded_max = parameters.employment_deduction_rate, parameters.employment_deduction_max
+            LCF, CEA, credit = parameters.federal_lcf, parameters.federal_cea, parameters.federal_credit_rate
+            abatement = parameters.quebec_abatement
+            income_tax_rate = parameters.quebec.lookup
+            federal_tax_rate = parameters.federal.lookup
+
+        # Quebec: Y(I + B) - Y(I)
+        dei = ded_rate * rem
+        if dei > ded_max / P:
+            dei = ded_max / P
+        sdr = (P * l19) / Pr
+        I = P * (rem - f - dei) - sdr
+        taxes = []
+        for income in (I + B, I):
+            T, K_qc = income_tax_rate(income)
+            Y = (T * income) - K_qc - k1 - (0.15 * e) - (0.15 * P * q) - (0.20 * P * q1)
+            taxes.append(Y if Y > 0 else 0)
+        quebec_tax = taxes[0] - taxes[1]
+        if quebec_tax < 0:
+            quebec_tax = 0
+
+        # cotisations de la paie reguliere (calculate_batch), puis du paiement sur ce qui reste
+        qpp_regular = qpp_rate * (rem - (V / P))
+        if a5 >= M:
+            a5 = M
+        if qpp_regular > M - a5:
+            qpp_regular = M - a5
+        qpp = qpp_rate * B
+        if qpp > M - a5 - max(qpp_regular, 0):
+            qpp = M - a5 - max(qpp_regular, 0)
+
+        qpip_regular = qpip_rate * rem
+        if a6 >= N:
+            a6 = N
+        if qpip_regular > N - a6:
+            qpip_regular = N - a6
+        qpip = qpip_rate * B
+        if qpip > N - a6 - qpip_regular:
+            qpip = N - a6 - qpip_regular
+
+        ei_regular = rem * ei_rate
+        year_max = ei_max
+        if year_max <= ei_so_far:
+            year_max = ei_so_far
+        if ei_regular > year_max - ei_so_far:
+            ei_regular = year_max - ei_so_far
+        ei = B * ei_rate
+        if ei > year_max - ei_so_far - ei_regular:
+            ei = year_max - ei_so_far - ei_regular
+
+        # Federal: T1(A + B) - T1(A), with the contributions of the regular pay
+        A = P * (rem - (qpp_regular + f) - u1)
+        if A <= 0:
+            A = 0
+        P_C = P * qpp_regular
+        if P_C > M:
+            P_C = M
+        P_AE = P * ei_regular
+        if P_AE > ei_max:
+            P_AE = ei_max
+        P_IE = P * rem * qpip_rate
+        if P_IE > N:
+            P_IE = N
+        K2Q = (credit * P_C) + (credit * P_AE) + (credit * P_IE)
+        taxes = []
+        for income in (A + B, A):
+            R, K = federal_tax_rate(income)
+            K4 = min(credit * income, credit * CEA)
+            T3 = (R * income) - K - credit * tc - K2Q - K4
+            if T3 < 0:
+                T3 = 0
+            T3_LCF = T3 - LCF
+            if T3_LCF < 0:
+                T3_LCF = 0
+            T1 = T3_LCF - abatement * T3
+            taxes.append(T1 if T1 > 0 else 0)
+        federal_tax = taxes[0] - taxes[1]
+        if federal_tax < 0:
+            federal_tax = 0
+
+        net = B - quebec_tax - federal_tax - qpp - qpip - ei
+        for append, value in zip(out, (quebec_tax, federal_tax, qpp, qpip, ei, net)):
+            append(value)
+
+    return results
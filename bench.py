@@ -0,0 +1,197 @@
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+
+import batch
+import federal
+import money
+import objects
+import rates
+
+
+# Mesure de performance des calculs. Times each calculator of objects.py and federal.py, the app.py chain
+# for one employee and synthetic company runs through batch.calculate_batch, and compares the results to
+# a stored baseline so a slower calculator shows up before a production pay run.
+# startup.* is a new Python process importing app and calculating one net pay, the cold start of a CLI
+# call or of a serverless pay stub. Each company run is also a process of its own, so its peak memory is
+# not the high-water mark of the runs before it.
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_baseline.json')
+PAY_PERIODS = (52, 26, 24, 12)
+DEFAULT_SIZES = (1000, 100000, 1000000)
+# a benchmark is a regression when it is this much slower than the baseline
+THRESHOLD = 1.25
+
+
+def employee_chain(remuneration, pay_periods=52, remaining_periods=50, E=15532):
+    """The calculation of app.py for one employee, with the classes of objects.py and federal.py."""
+    deduction = objects.DeductionForEmploymentIncome(remuneration, pay_periods).calculate()
+    source_deduction_return = objects.SourceDeductionReturn(pay_periods, 0, remaining_periods).calculate()
+    annual_income = objects.AnnualIncome(pay_periods, remuneration, 0, deduction, source_deduction_return).calculate()
+    income_tax_year = objects.IncomeTaxYear(I=annual_income, E=E, P=pay_periods).calculate()
+    quebec_tax = objects.IncomeTaxWithheldPerPeriod(income_tax_year, pay_periods).calculate()
+    qpp = objects.QuebecPensionPlan(S3=remuneration, P=pay_periods).calculate()
+    qpip = objects.QuebecParentalInsurancePlan(S4=remuneration).calculate()
+    A = federal.AnnualTaxableIncome(P=pay_periods, I=remuneration, F=qpp).calculate()
+    ei = federal.EmployementInsurance(remuneration).calculate()
+    T3 = federal.BasicFederalTax(A=A, P=pay_periods, C=qpp, AE=ei, IE=remuneration).calculate()
+    T1 = federal.AnnualPayableTaxFederal(T3).calculate()
+    return remuneration - T1 / pay_periods - qpip - qpp - quebec_tax - ei
+
+
+CALCULATORS = {
+    'DeductionForEmploymentIncome': lambda: objects.DeductionForEmploymentIncome(1464.56, 52).calculate(),
+    'SourceDeductionReturn': lambda: objects.SourceDeductionReturn(52, 0, 50).calculate(),
+    'AnnualIncome': lambda: objects.AnnualIncome(52, 1464.56, 0, 22.88, 0).calculate(),
+    'IncomeTaxYear': lambda: objects.IncomeTaxYear(I=74967.12, E=15532, P=52).calculate(),
+    'IncomeTaxWithheldPerPeriod': lambda: objects.IncomeTaxWithheldPerPeriod(10436.62, 52).calculate(),
+    'QuebecPensionPlan': lambda: objects.QuebecPensionPlan(S3=1464.56, P=52).calculate(),
+    'QuebecParentalInsurancePlan': lambda: objects.QuebecParentalInsurancePlan(S4=1464.56).calculate(),
+    'AnnualTaxableIncome': lambda: federal.AnnualTaxableIncome(P=52, I=1464.56, F=79.64).calculate(),
+    'EmployementInsurance': lambda: federal.EmployementInsurance(1464.56).calculate(),
+    'BasicFederalTax': lambda: federal.BasicFederalTax(A=72015.66, P=52, C=79.64, AE=17.57, IE=1464.56).calculate(),
+    'AnnualPayableTaxFederal': lambda: federal.AnnualPayableTaxFederal(11279.77).calculate(),
+    'employee_chain': lambda: employee_chain(1464.56),
+    'rates.snapshot': lambda: rates.Registry().get('2020-01-03'),
+    'rates.json': lambda: rates.Registry(use_snapshot=False).get('2020-01-03'),
+}
+
+STARTUP = "import app; app.calculate(1464.56, 52, 50, 15532, pay_date='2020-01-03')"
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def peak_memory_mb():
+    # ru_maxrss est en kilo-octets sous Linux, le maximum du processus depuis son debut
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def time_calls(function, repeat):
+    """Latency of repeat calls, in microseconds."""
+    timer = time.perf_counter_ns
+    latencies = []
+    for _ in range(repeat):
+        start = timer()
+        function()
+        latencies.append((timer() - start) / 1000)
+    total = sum(latencies) / 1e6
+    return {'calls_per_s': repeat / total, 'p50_us': percentile(latencies, 0.5),
+            'p95_us': percentile(latencies, 0.95), 'p99_us': percentile(latencies, 0.99)}
+
+
+def company(size, pay_periods, seed=1):
+    """Synthetic columns for a company of size employees."""
+    rnd = random.Random(seed)
+    return {
+        'remuneration': [round(rnd.uniform(20000, 150000) / pay_periods, 2) for _ in range(size)],
+        'pay_periods': pay_periods,
+        'remaining_periods': [rnd.randint(1, pay_periods) for _ in range(size)],
+        'E': [rnd.choice((15532, 15532, 15532, 0, 25000)) for _ in range(size)],
+    }
+
+
+def time_company(size, pay_periods, cents=False):
+    """Throughput of one synthetic company run, in a new process: peak_mb is the peak memory of that
+    process alone (interpreter, columns and results).
+    """
+    code = 'import bench, json; print(json.dumps(bench._time_company(%d, %d, %r)))' % (size, pay_periods, cents)
+    completed = subprocess.run([sys.executable, '-c', code], cwd=os.path.dirname(os.path.abspath(__file__)), check=True,
+                               stdout=subprocess.PIPE)
+    return json.loads(completed.stdout)
+
+
+def _time_company(size, pay_periods, cents):
+    columns = company(size, pay_periods)
+    calculate = batch.calculate_batch
+    if cents:
+        columns['remuneration'] = [money.to_cents(value) for value in columns['remuneration']]
+        columns['E'] = [money.to_cents(value) for value in columns['E']]
+        calculate = money.calculate_batch
+    start = time.perf_counter()
+    calculate(**columns)
+    seconds = time.perf_counter() - start
+    return {'employees_per_s': size / seconds, 'seconds': seconds, 'peak_mb': peak_memory_mb()}
+
+
+def time_startup(repeat):
+    """Latency of a new interpreter running STARTUP, in microseconds; startup.python is the interpreter alone."""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    return {name: time_calls(lambda: subprocess.run([sys.executable, '-c', code], cwd=directory, check=True), repeat)
+            for name, code in (('startup.python', 'pass'), ('startup.first_result', STARTUP))}
+
+
+def run(sizes=DEFAULT_SIZES, repeat=20000, startup_repeat=20):
+    results = {}
+    for name, function in CALCULATORS.items():
+        results['scalar.%s' % name] = time_calls(function, repeat)
+    results.update(time_startup(startup_repeat))
+    for size in sizes:
+        for pay_periods in PAY_PERIODS:
+            results['company.%d.P%d' % (size, pay_periods)] = time_company(size, pay_periods)
+        # calcul exact en cents, a comparer a company.<size>.P52
+        results['company.%d.P52.cents' % size] = time_company(size, 52, cents=True)
+    return results
+
+
+def throughput(result):
+    return result.get('calls_per_s') or result.get('employees_per_s')
+
+
+def compare(results, baseline, threshold=THRESHOLD):
+    """Names of the benchmarks more than threshold times slower than in the baseline."""
+    regressions = []
+    for name, result in results.items():
+        if name in baseline and throughput(baseline[name]) > threshold * throughput(result):
+            regressions.append(name)
+    return regressions
+
+
+def report(results, baseline=None, out=sys.stdout):
+    for name, result in results.items():
+        line = '%-45s %12.0f /s' % (name, throughput(result))
+        if 'p50_us' in result:
+            line += '  p50 %7.2f us  p95 %7.2f us  p99 %7.2f us' % (result['p50_us'], result['p95_us'], result['p99_us'])
+        else:
+            line += '  %8.3f s  peak %7.1f MB' % (result['seconds'], result['peak_mb'])
+        if baseline and name in baseline:
+            line += '  (%+.0f%% vs baseline)' % (100 * (throughput(result) / throughput(baseline[name]) - 1))
+        print(line, file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the payroll calculators.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help='company sizes')
+    parser.add_argument('--repeat', type=int, default=20000, help='calls per scalar calculator')
+    parser.add_argument('--startup-repeat', type=int, default=20, help='processes started per startup benchmark')
+    parser.add_argument('--baseline', default=BASELINE, help='baseline file')
+    parser.add_argument('--save-baseline', action='store_true', help='store these results as the baseline')
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.repeat, args.startup_repeat)
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    report(results, baseline)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+    elif baseline:
+        regressions = compare(results, baseline)
+        if regressions:
+            print('regressions: %s' % ', '.join(regressions), file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
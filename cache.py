@@ -0,0 +1,101 @@
+import collections
+import itertools
+
+import batch
+import rates
+
+
+# Cache des retenues par profil de paie. Most employees of a run have the same inputs, so the results of
+# the whole chain are kept by profile and reused. The profile is normalized first: inputs that cannot
+# change the result (remaining periods without line 19, amounts paid so far far from the maximum) are
+# dropped from the key, so more employees share a profile.
+
+# Size of one entry: key tuple, tuple of len(batch.OUTPUTS) floats and the LRU links. About 690 bytes with
+# tracemalloc for distinct remunerations, rounded up.
+ENTRY_BYTES = 800
+
+
+def profile(remuneration, pay_periods, remaining_periods, E, K1=0, Q=0, Q1=0, A5=0, A6=0, ei_paid=0,
+            line_19=0, TC=0, pay_date=None, F=0, U1=0):
+    """Normalized cache key of one employee's pay."""
+    parameters = rates.get(pay_date)
+    if not line_19:
+        remaining_periods = 0
+    # same comparisons as batch.calculate_batch, so the key only drops an amount that is not used
+    qpp = parameters.qpp_rate * (remuneration - (parameters.qpp_exemption / pay_periods))
+    M = parameters.qpp_max
+    if A5 < M and not qpp > M - A5 and not qpp > M:
+        A5 = 0
+    qpip = parameters.qpip_rate * remuneration
+    N = parameters.qpip_max
+    if A6 < N and not qpip > N - A6 and not qpip > N:
+        A6 = 0
+    ei = remuneration * parameters.ei_rate
+    ei_max = parameters.ei_max
+    if ei_paid < ei_max and not ei > ei_max - ei_paid and not ei > ei_max:
+        ei_paid = 0
+    return (remuneration, pay_periods, remaining_periods, E, K1, Q, Q1, A5, A6, ei_paid, line_19, TC,
+            parameters.effective, F, U1)
+
+
+class WithholdingCache():
+    """LRU cache of the source deductions (batch.OUTPUTS) by normalized pay profile.
+    maxsize = number of profiles kept, about ENTRY_BYTES each
+    max_bytes = memory budget of the cache, replaces maxsize by max_bytes // ENTRY_BYTES profiles
+    """
+    def __init__(self, maxsize=100000, max_bytes=None):
+        if max_bytes is not None:
+            maxsize = max_bytes // ENTRY_BYTES
+        self.maxsize = maxsize
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def calculate(self, remuneration, pay_periods, remaining_periods, E, **inputs):
+        """Deductions of one employee as a dict keyed by batch.OUTPUTS."""
+        results = self.calculate_batch([remuneration], pay_periods, remaining_periods, E, **inputs)
+        return dict((name, values[0]) for name, values in results.items())
+
+    def calculate_batch(self, remuneration, pay_periods, remaining_periods, E, K1=0, Q=0, Q1=0,
+                        A5=0, A6=0, ei_paid=0, line_19=0, TC=0, pay_date=None, F=0, U1=0):
+        """Same as batch.calculate_batch, only the profiles missing from the cache are calculated."""
+        size = batch._size(remuneration, pay_periods, remaining_periods, E, K1, Q, Q1, A5, A6, ei_paid, line_19, TC, pay_date, F, U1)
+        columns = (remuneration, pay_periods, remaining_periods, E, K1, Q, Q1, A5, A6, ei_paid, line_19, TC, pay_date, F, U1)
+        rows = list(itertools.islice(zip(*[batch._column(column) for column in columns]), size))
+        entries = self.entries
+        keys = [profile(*row) for row in rows]
+
+        found = [None] * size
+        missing = {}
+        for i, key in enumerate(keys):
+            values = entries.get(key)
+            if values is None:
+                missing.setdefault(key, i)
+            else:
+                entries.move_to_end(key)
+                found[i] = values
+        self.misses += len(missing)
+        self.hits += size - len(missing)
+
+        if missing:
+            new = batch.calculate_batch(*zip(*[rows[i] for i in missing.values()]))
+            new = dict((key, values) for key, values in zip(missing, zip(*[new[name] for name in batch.OUTPUTS])))
+            for i, key in enumerate(keys):
+                if found[i] is None:
+                    found[i] = new[key]
+            entries.update(new)
+            while len(entries) > self.maxsize:
+                entries.popitem(last=False)
+
+        return dict((name, [values[n] for values in found]) for n, name in enumerate(batch.OUTPUTS))
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self.entries), 'maxsize': self.maxsize}
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
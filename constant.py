@@ -1,8 +1,6 @@
+import os
 
-# from table page 13
-INCOME_TAX_RATE_APPLICABLE =   [{'min': 0, 'max': 44545, 'income_tax_rate': 0.15, 'constant_k': 0},
-								{'min': 44545, 'max': 89080, 'income_tax_rate': 0.20, 'constant_k': 2227},
-								{'min': 89080, 'max': 108390, 'income_tax_rate': 0.24, 'constant_k': 5790},
-								{'min': 108390, 'max': 99999999999999, 'income_tax_rate': 0.15, 'constant_k': 0}, # I clearly doubt someone will make more than this. If yes they won't use this program.
-								]
 
+# Les taux, maximums et tables d'impot sont dans rates/, un fichier par date d'entree en vigueur.
+RATES_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rates')
+DEFAULT_YEAR = 2020 # year used when no pay date is given
@@ -1,3 +1,7 @@
+import array
+
+import batch
+import rates
 
 
 # company
@@ -14,42 +18,304 @@
 
 
 class Employee():
-	def __init__(self, pay_periods, remuneration_per_period, line_19, remaining_periods, ei_rate, ei_year_max, holiday_rate, CEA):
+	"""One employee and the values of the source deduction forms they filled.
+	remaining_periods = pay periods left in the year, including the next one, when the employee is hired
+	holiday_rate = vacation pay accrued on the remuneration (noted with each pay, not withheld)
+	The EI rate and maximum and the federal CEA are the ones in effect on the pay date (see rates.get).
+	The arguments after remaining_periods are given by name.
+	"""
+	__slots__ = ('employee_id', 'pay_periods', 'remuneration_per_period', 'line_19', 'remaining_periods',
+				 'holiday_rate', 'E', 'K1', 'Q', 'Q1', 'TC')
+
+	def __init__(self, pay_periods, remuneration_per_period, line_19, remaining_periods, *, holiday_rate=0.06, employee_id=None, E=0, K1=0, Q=0, Q1=0, TC=0):
+		self.employee_id = employee_id
 		self.pay_periods = pay_periods
 		self.remuneration_per_period = remuneration_per_period
 		self.line_19 = line_19
 		self.remaining_periods = remaining_periods
-		self.ei_rate = ei_rate
-		self.ei_year_max = ei_year_max
-		self.holiday_rate =Holiday_rate
-		self.CEA = CEA
+		self.holiday_rate = holiday_rate
+		self.E = E # TP-1015.3-V
+		self.K1 = K1
+		self.Q = Q # Fonds de solidarite FTQ
+		self.Q1 = Q1 # Fondaction
+		self.TC = TC # TD1
+
+
+class Adjustment():
+	"""Correction made to a pay after it was paid."""
+	__slots__ = ('date', 'hours', 'brut_pay', 'net_pay')
+
+	def __init__(self, date, hours, brut_pay, net_pay):
+		self.date = date
+		self.hours = hours
+		self.brut_pay = brut_pay
+		self.net_pay = net_pay
 
 
 class EmployeePeriodPay():
-	def __init__(self, employee, company, remaining_pay_period, pay_period_per_year):
-		self.employee = employee # list
+	"""Pay of one employee for one pay period."""
+	__slots__ = ('employee', 'company', 'remaining_pay_period', 'pay_period_per_year', 'pay_date', 'pay_number',
+				 'hours', 'brut_pay', 'net_pay', 'deductions', 'adjustments')
+
+	def __init__(self, employee, company, remaining_pay_period, pay_period_per_year, pay_date=None, pay_number=None, hours=0, brut_pay=0, net_pay=None, deductions=None):
+		self.employee = employee
 		self.company = company
 		self.remaining_pay_period = remaining_pay_period # Number
 		self.pay_period_per_year = pay_period_per_year
+		self.pay_date = pay_date
+		self.pay_number = pay_number
+		self.hours = hours
+		self.brut_pay = brut_pay
+		self.net_pay = net_pay
+		self.deductions = deductions # dict of the batch.OUTPUTS values
+		self.adjustments = []
+
 
-		
 
 class Company():
+	"""Employer, its contribution rates and its employees.
+	RRQ_rate, RQAP_rate, EI_rate = employer contribution as a multiple of the employee contribution
+		(1 for QPP, 0.00691 / 0.00494 for QPIP, 1.4 for EI)
+	CSST_rate, FSS_rate = CNESST and Health Services Fund rates on gross payroll
+	"""
+	__slots__ = ('CSST_rate', 'RRQ_rate', 'RQAP_rate', 'EI_rate', 'FSS_rate', 'employees', 'history', 'year')
+
 	def __init__(self, CSST_rate, RRQ_rate, RQAP_rate, EI_rate, FSS_rate,):
-		self.CSST_rate = csst_rate
+		self.CSST_rate = CSST_rate
 		self.RRQ_rate = RRQ_rate
 		self.RQAP_rate = RQAP_rate
 		self.EI_rate = EI_rate
 		self.FSS_rate = FSS_rate
+		self.employees = EmployeeTable()
+		self.history = PayHistory()
+		self.year = None # annee de la derniere paie
+
+	def hire(self, employee):
+		"""Adds an employee and returns the index of the employee in self.employees."""
+		return self.employees.append(employee)
+
+	def pay_run(self, pay_date, pay_number, remaining_periods=None, hours=0):
+		"""Calculates the pay of every employee for one period and records it in the history.
+		remaining_periods = pay periods left in the year including this one, defaults to the count kept for
+			each employee, which goes down by one with every run
+		The QPP, QPIP and EI withheld are added to the year to date totals of each employee, so the annual
+		maximums apply. The first run of a later year starts the totals and the counts of periods again.
+		ValueError for a pay date already paid or in a year before the last run. Nothing is changed when
+		the run fails.
+		"""
+		day = rates.to_date(pay_date)
+		if day in self.history.pay_dates:
+			raise ValueError('a pay on %s is already recorded' % day)
+		if self.year is not None and day.year < self.year:
+			raise ValueError('pay date %s is before the year %d of the last pay run' % (day, self.year))
+		new_year = self.year is not None and day.year > self.year
+		results = self.employees.calculate(pay_date, remaining_periods, new_year)
+		# le calcul a reussi: l'etat de la compagnie change seulement maintenant
+		if new_year:
+			self.employees.new_year()
+		self.year = day.year
+		self.employees.add_year_to_date(results)
+		self.history.add_run(pay_date, pay_number, hours, self.employees.remuneration, results['net_pay'])
+		results['remuneration'] = self.employees.remuneration
+		results['holiday_pay'] = [rem * rate for rem, rate in zip(self.employees.remuneration, self.employees.holiday_rate)]
+		return results
+
+
+class EmployeeTable():
+	"""Employees of a company kept column by column in compact arrays (struct of arrays).
+	COLUMNS are passed as is to batch.calculate_batch, with remaining_periods and the year to date
+	totals A5, A6 and ei_paid.
+	"""
+	COLUMNS = (('pay_periods', 'H'), ('remuneration', 'd'), ('line_19', 'd'), ('E', 'd'), ('K1', 'd'),
+			   ('Q', 'd'), ('Q1', 'd'), ('TC', 'd'))
+	YEAR_TO_DATE = ('A5', 'A6', 'ei_paid')
+	__slots__ = ('ids', 'remaining_periods', 'holiday_rate') + tuple(name for name, code in COLUMNS) + YEAR_TO_DATE
+
+	def __init__(self):
+		self.ids = []
+		for name, code in self.COLUMNS:
+			setattr(self, name, array.array(code))
+		self.remaining_periods = array.array('H')
+		self.holiday_rate = array.array('d')
+		for name in self.YEAR_TO_DATE:
+			setattr(self, name, array.array('d'))
+
+	def __len__(self):
+		return len(self.ids)
+
+	def append(self, employee):
+		self.ids.append(employee.employee_id if employee.employee_id is not None else len(self.ids))
+		self.pay_periods.append(employee.pay_periods)
+		self.remuneration.append(employee.remuneration_per_period)
+		self.line_19.append(employee.line_19)
+		self.E.append(employee.E)
+		self.K1.append(employee.K1)
+		self.Q.append(employee.Q)
+		self.Q1.append(employee.Q1)
+		self.TC.append(employee.TC)
+		self.remaining_periods.append(employee.remaining_periods)
+		self.holiday_rate.append(employee.holiday_rate)
+		for name in self.YEAR_TO_DATE:
+			getattr(self, name).append(0)
+		return len(self.ids) - 1
+
+	def columns(self):
+		return dict((name, getattr(self, name)) for name, code in self.COLUMNS)
+
+	def calculate(self, pay_date, remaining_periods=None, new_year=False):
+		"""Source deductions of every employee for one pay period with the year to date totals, see batch.calculate_batch.
+		remaining_periods defaults to the count kept for each employee.
+		new_year = calculate the first period of a new year (no totals, every period left), without changing the table
+		"""
+		A5, A6, ei_paid = self.A5, self.A6, self.ei_paid
+		if new_year:
+			A5 = A6 = ei_paid = 0
+		if remaining_periods is None:
+			remaining_periods = self.pay_periods if new_year else self.remaining_periods
+		return batch.calculate_batch(remaining_periods=remaining_periods, A5=A5, A6=A6, ei_paid=ei_paid,
+									 pay_date=pay_date, **self.columns())
+
+	def add_year_to_date(self, results):
+		"""Adds the contributions of a run to the year to date totals and counts the period as paid."""
+		for name, output in zip(self.YEAR_TO_DATE, ('quebec_pension_plan', 'quebec_parental_insurance_plan', 'employement_insurance')):
+			column = getattr(self, name)
+			for i, value in enumerate(results[output]):
+				column[i] += value
+		remaining = self.remaining_periods
+		for i in range(len(remaining)):
+			# jamais 0: la derniere periode de l'annee est repetee jusqu'a la nouvelle annee
+			if remaining[i] > 1:
+				remaining[i] -= 1
+
+	def new_year(self):
+		"""Starts the year to date totals again and gives every employee a full year of pay periods."""
+		for name in self.YEAR_TO_DATE:
+			column = getattr(self, name)
+			for i in range(len(column)):
+				column[i] = 0
+		self.remaining_periods = array.array('H', self.pay_periods)
+
+
+class PayHistory():
+	"""Pays of a company, one block of arrays per pay run.
+	Amounts are kept in cents and hours in hundredths in 32 bit integers (12 bytes per employee per period).
+	employees = indexes in the EmployeeTable, None when the run paid every employee in order
+	"""
+	__slots__ = ('pay_dates', 'pay_numbers', 'employees', 'hours', 'brut_pay', 'net_pay')
+
+	def __init__(self):
+		self.pay_dates = []
+		self.pay_numbers = []
+		self.employees = []
+		self.hours = []
+		self.brut_pay = []
+		self.net_pay = []
+
+	def __len__(self):
+		return len(self.pay_dates)
+
+	def add_run(self, pay_date, pay_number, hours, brut_pay, net_pay, employees=None):
+		if isinstance(hours, (int, float)):
+			hours = [hours] * len(brut_pay)
+		self.pay_dates.append(rates.to_date(pay_date))
+		self.pay_numbers.append(pay_number)
+		self.employees.append(array.array('I', employees) if employees is not None else None)
+		self.hours.append(array.array('i', [round(value * 100) for value in hours]))
+		self.brut_pay.append(array.array('i', [round(value * 100) for value in brut_pay]))
+		self.net_pay.append(array.array('i', [round(value * 100) for value in net_pay]))
+
+	def run(self, index):
+		"""(pay_date, pay_number, employees, hours, brut_pay, net_pay) of one run, amounts in dollars."""
+		employees = self.employees[index]
+		if employees is None:
+			employees = range(len(self.brut_pay[index]))
+		return (self.pay_dates[index], self.pay_numbers[index], employees, [value / 100 for value in self.hours[index]],
+				[value / 100 for value in self.brut_pay[index]], [value / 100 for value in self.net_pay[index]])
+
+	def totals(self, size):
+		"""Total brut and net pay per employee over every run, for an EmployeeTable of size employees."""
+		brut = [0] * size
+		net = [0] * size
+		for employees, brut_pay, net_pay in zip(self.employees, self.brut_pay, self.net_pay):
+			if employees is None:
+				employees = range(len(brut_pay))
+			for i, b, n in zip(employees, brut_pay, net_pay):
+				brut[i] += b
+				net[i] += n
+		return [value / 100 for value in brut], [value / 100 for value in net]
 
 
 
 
-def weekly_company_payment(employee_pays, fees, qst, gst):
-	pass
+def weekly_company_payment(employee_pays, fees, qst, gst, company=None):
+	"""Employer contributions and remittances for one pay run.
+	employee_pays = results of a run as columns (Company.pay_run, or batch.calculate_batch with a
+		'remuneration' column added), or a list of EmployeePeriodPay with their deductions; a pay made
+		with employee_pay(..., net_pay=...) has none and raises ValueError
+	fees = payroll service fees for the run, taxed at qst and gst
+	company = Company giving the employer rates, defaults to the company of the first EmployeePeriodPay
+	Returns a dict of totals rounded to the cent. Revenu Quebec receives the Quebec income tax, QPP,
+	QPIP, FSS and CNESST, the CRA receives the federal income tax and EI.
+	"""
+	if not isinstance(employee_pays, dict):
+		pays = list(employee_pays)
+		if company is None and pays:
+			company = pays[0].company
+		for pay in pays:
+			if pay.deductions is None:
+				raise ValueError('the pay of employee %s on %s has no deductions to remit, its net pay was given'
+								 % (pay.employee.employee_id, pay.pay_date))
+		employee_pays = dict((name, [pay.deductions[name] for pay in pays]) for name in batch.OUTPUTS)
+		employee_pays['remuneration'] = [pay.brut_pay for pay in pays]
+	if company is None:
+		raise ValueError('company is needed for the employer rates')
 
-def employee_pay(pay_date, pay_number, employee, hours, brut_pay, net_pay,):
-	pass
+	gross = sum(employee_pays['remuneration'])
+	quebec_tax = sum(employee_pays['income_tax_withheld_period'])
+	federal_tax = sum(employee_pays['federal_tax_per_period'])
+	qpp = sum(employee_pays['quebec_pension_plan'])
+	qpip = sum(employee_pays['quebec_parental_insurance_plan'])
+	ei = sum(employee_pays['employement_insurance'])
+	net_pay = sum(employee_pays['net_pay'])
 
+	qpp_employer = qpp * company.RRQ_rate
+	qpip_employer = qpip * company.RQAP_rate
+	ei_employer = ei * company.EI_rate
+	cnesst = gross * company.CSST_rate
+	fss = gross * company.FSS_rate
+	revenu_quebec = quebec_tax + qpp + qpp_employer + qpip + qpip_employer + fss + cnesst
+	cra = federal_tax + ei + ei_employer
+	fees_with_taxes = fees + fees * qst + fees * gst
 
+	totals = {
+		'employees': len(employee_pays['remuneration']),
+		'gross': gross,
+		'net_pay': net_pay,
+		'quebec_tax': quebec_tax,
+		'federal_tax': federal_tax,
+		'qpp_employee': qpp,
+		'qpp_employer': qpp_employer,
+		'qpip_employee': qpip,
+		'qpip_employer': qpip_employer,
+		'ei_employee': ei,
+		'ei_employer': ei_employer,
+		'cnesst': cnesst,
+		'fss': fss,
+		'revenu_quebec': revenu_quebec,
+		'cra': cra,
+		'fees': fees_with_taxes,
+		'total_cost': net_pay + revenu_quebec + cra + fees_with_taxes,
+	}
+	return dict((name, value if name == 'employees' else round(value, 2)) for name, value in totals.items())
 
+def employee_pay(pay_date, pay_number, employee, hours, brut_pay, net_pay=None, company=None, remaining_periods=None):
+	"""Pay of one employee. When net_pay is not given, it is calculated from brut_pay."""
+	if remaining_periods is None:
+		remaining_periods = employee.remaining_periods
+	deductions = None
+	if net_pay is None:
+		results = batch.calculate_batch([brut_pay], employee.pay_periods, remaining_periods, employee.E, employee.K1,
+										 employee.Q, employee.Q1, line_19=employee.line_19, TC=employee.TC, pay_date=pay_date)
+		deductions = dict((name, values[0]) for name, values in results.items())
+		net_pay = deductions['net_pay']
+	return EmployeePeriodPay(employee, company, remaining_periods, employee.pay_periods, pay_date, pay_number, hours, brut_pay, net_pay, deductions)
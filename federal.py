@@ -1,4 +1,4 @@
-import constant
+import rates
 
 class AnnualTaxableIncome(): # A
     """Annual income formula
@@ -23,6 +23,7 @@ class AnnualTaxableIncome(): # A
         self.U1 = U1 # paiement syndicat
         self.HD = HD # Deduction pour region, voir formulaire TD1
         self.F1 = F1 # pensions et autres
+        self.L = L
         
     def calculate(self):
         # [P x (I - F - F2 - U1)] - HD - F1
@@ -31,8 +32,16 @@ class AnnualTaxableIncome(): # A
             result = self.L
         return result
 
-    def calculate_comission(self):
-        pass
+    def calculate_comission(self, I1, E=0):
+        """Annual taxable income of a commission employee who filed Form TD1X
+        A = I1 – E – [P × (F + F2 + U1)] – HD – F1
+        I1  Total remuneration for the year reported on Form TD1X
+        E   Total expenses reported on Form TD1X
+        """
+        result = I1 - E - (self.P * (self.F + self.F2 + self.U1)) - self.HD - self.F1
+        if result <= 0:
+            result = self.L
+        return result
 
 class BasicFederalTax(): # T3
     """Formula to calculate the basic federal tax
@@ -40,7 +49,7 @@ class BasicFederalTax(): # T3
     T3 = (R × A) – K – K1 – K2 – K3 – K4
     If the result is negative, T3 = $0.
     A = Annual taxable income(see previous formula result)
-    R and K are based on 2020 index values
+    R and K are based on 2020 index values, looked up from A in the federal table in effect on pay_date when not given
     A see the Rates (R, V), income thresholds (A), and constants (K, KP) for 2020 Table 9.1 in Chapter 9.
     K   Federal constant. The constant is the tax overcharged when applying the 20.5%, 26%, 29%, and 33% rates to the annual taxable income A
     K1 = 0.15 × TC
@@ -55,15 +64,20 @@ class BasicFederalTax(): # T3
     P   The number of pay periods in the year
     C   Canada (or Quebec) Pension Plan contributions for the pay period
     AE  Assurance emploi?
+    CEA Canada employment amount, defaults to the value in effect on pay_date
     
 
 
     """
 
-    def __init__(self, R, A, K, K1, K2Q, K3, K4, TC, P, C, AE, IE, CEA):
-        self.R = R
+    def __init__(self, R=None, A=0, K=None, K1=0, K2Q=0, K3=0, K4=0, TC=0, P=52, C=0, AE=0, IE=0, CEA=None, pay_date=None):
+        self.parameters = parameters = rates.get(pay_date)
         self.A = A
-        self.K = K
+        self.R, self.K = parameters.federal.lookup(self.A)
+        if R is not None:
+            self.R = R
+        if K is not None:
+            self.K = K
         self.K3 = K3
         self.K4 = K4
         self.TC = TC
@@ -71,27 +85,28 @@ class BasicFederalTax(): # T3
         self.C = C
         self.AE = AE
         self.IE = IE
-        self.CEA = CEA
+        self.CEA = CEA if CEA is not None else parameters.federal_cea
+        credit_rate = parameters.federal_credit_rate
 
-        self.K1 = 0.15 * self.TC  
-        if self.P * self.C > 3146.4:
-            self.P_C = 3146.4
+        self.K1 = credit_rate * self.TC  
+        if self.P * self.C > parameters.qpp_max:
+            self.P_C = parameters.qpp_max
         else:
             self.P_C = self.P * self.C
 
-        if self.P * self.AE > 650.4:
-            self.P_AE = 650.4
+        if self.P * self.AE > parameters.ei_max:
+            self.P_AE = parameters.ei_max
         else:
             self.P_AE = self.P * self.AE
 
-        self.P_IE = self.P * self.IE
-        if self.P_IE * 0.00494 > 387.79:
-            self.P_IE = 387.79
+        self.P_IE = self.P * self.IE * parameters.qpip_rate
+        if self.P_IE > parameters.qpip_max:
+            self.P_IE = parameters.qpip_max
 
-        self.K4 = min(0.15 * self.A, 0.15 * self.CEA)
+        self.K4 = min(credit_rate * self.A, credit_rate * self.CEA)
 
 
-        self.K2Q = ((0.15 * self.P_C) + (0.15 * self.P_AE) + (0.15 * self.P_IE))
+        self.K2Q = ((credit_rate * self.P_C) + (credit_rate * self.P_AE) + (credit_rate * self.P_IE))
 
 
     def calculate(self):
@@ -103,17 +118,70 @@ class BasicFederalTax(): # T3
         return result
 
 class AnnualPayableTaxFederal(): # T1
-    """docstring for AnnualPayableTaxFederal"""
-    def __init__(self, T3, LCF):
+    """T1 = (T3 – LCF) – (0.165 × T3), LCF and the Quebec abatement default to the values in effect on pay_date"""
+    def __init__(self, T3, LCF=None, pay_date=None):
+        self.parameters = rates.get(pay_date)
         self.T3 = T3
-        self.LCF = LCF
+        self.LCF = LCF if LCF is not None else self.parameters.federal_lcf
     
     def calculate(self):
         self.T3_LCF = self.T3 - self.LCF
         if self.T3_LCF < 0:
             self.T3_LCF = 0
 
-        result = (self.T3_LCF) - 0.165 * self.T3
+        result = (self.T3_LCF) - self.parameters.quebec_abatement * self.T3
+        if result < 0:
+            result = 0
+        return result
+
+
+class FederalTaxOnCommission():
+    """Federal tax on a commission payment (TD1X)
+    T = (T1 × G / I1) + L
+    T1  Annual payable federal tax calculated with A from AnnualTaxableIncome.calculate_comission
+    G   Gross commission for the pay period
+    I1  Total remuneration for the year reported on Form TD1X
+    """
+    def __init__(self, T1, G, I1, L=0):
+        self.T1 = T1
+        self.G = G
+        self.I1 = I1
+        self.L = L
+
+    def calculate(self):
+        if self.I1 <= 0:
+            return self.L
+        result = (self.T1 * self.G / self.I1) + self.L
+        return result
+
+
+class FederalTaxOnNonPeriodicPayment():
+    """Federal tax on a bonus, retroactive pay increase or other non-periodic payment B
+    = T1(A + B) – T1(A), the annual payable tax with and without the payment
+    A   Annual taxable income without the payment (AnnualTaxableIncome)
+    B   Non-periodic payment, less the RPP, RRSP and union dues deducted from it
+    P, C, AE, IE, TC, K3, CEA see BasicFederalTax, LCF see AnnualPayableTaxFederal
+    IE  Insurable earnings of the regular pay period (QPIP), not A
+    """
+    def __init__(self, A, B, P=52, C=0, AE=0, IE=0, TC=0, K3=0, CEA=None, LCF=None, pay_date=None):
+        self.A = A
+        self.B = B
+        self.P = P
+        self.C = C
+        self.AE = AE
+        self.IE = IE
+        self.TC = TC
+        self.K3 = K3
+        self.CEA = CEA
+        self.LCF = LCF
+        self.pay_date = pay_date
+
+    def annual_tax(self, A):
+        T3 = BasicFederalTax(A=A, K3=self.K3, TC=self.TC, P=self.P, C=self.C, AE=self.AE, IE=self.IE, CEA=self.CEA, pay_date=self.pay_date).calculate()
+        return AnnualPayableTaxFederal(T3, self.LCF, self.pay_date).calculate()
+
+    def calculate(self):
+        result = self.annual_tax(self.A + self.B) - self.annual_tax(self.A)
         if result < 0:
             result = 0
         return result
@@ -131,19 +199,21 @@ class FederalTaxRate():
         return result
 
 class EmployementInsurance():
-    """Employement insurance premium"""
-    def __init__(self, insurable_earning, premium_rate, year_max, paid_this_year):
+    """Employement insurance premium, premium_rate and year_max default to the values in effect on pay_date"""
+    def __init__(self, insurable_earning, premium_rate=None, year_max=None, paid_this_year=0, pay_date=None):
+        parameters = rates.get(pay_date)
         self.insurable_earning = insurable_earning
-        self.premium_rate = premium_rate
-        self.year_max = year_max
+        self.premium_rate = premium_rate if premium_rate is not None else parameters.ei_rate
+        self.year_max = year_max if year_max is not None else parameters.ei_max
         self.paid_this_year = paid_this_year
 
     def calculate(self):
         result = self.insurable_earning * self.premium_rate
-        if self.year_max <= self.paid_this_year:
-            self.year_max = self.paid_this_year
-        if result > (self.year_max - self.paid_this_year):
-            result = self.year_max - self.paid_this_year
+        year_max = self.year_max
+        if year_max <= self.paid_this_year:
+            year_max = self.paid_this_year
+        if result > (year_max - self.paid_this_year):
+            result = year_max - self.paid_this_year
 
         return result
         
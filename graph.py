@@ -0,0 +1,153 @@
+import types
+
+import federal
+import objects
+
+
+# Graphe des formules: the chain of app.py declared once, node by node. Each node is a function whose
+# arguments are the inputs or the other nodes it needs. A Calculation evaluates a node the first time it
+# is asked for, keeps the value and never calculates it again, and the nodes nobody asks for (directly
+# or through another node) are never calculated.
+
+INPUTS = {'remuneration': None, 'pay_periods': None, 'remaining_periods': None, 'E': None, 'K1': 0, 'Q': 0, 'Q1': 0,
+          'A5': 0, 'A6': 0, 'ei_paid': 0, 'line_19': 0, 'TC': 0, 'pay_date': None, 'F': 0, 'U1': 0}
+
+# name -> (function, names of its arguments)
+NODES = {}
+
+
+def node(function):
+    """Declares a node named after the function, its dependencies are the names of its arguments."""
+    code = function.__code__
+    NODES[function.__name__] = (function, code.co_varnames[:code.co_argcount])
+    return function
+
+
+# Quebec
+
+@node
+def deduction_employment_income(remuneration, pay_periods, pay_date):
+    return objects.DeductionForEmploymentIncome(remuneration, pay_periods, pay_date).calculate()
+
+
+@node
+def source_deduction_return(pay_periods, line_19, remaining_periods):
+    return objects.SourceDeductionReturn(pay_periods, line_19, remaining_periods).calculate()
+
+
+@node
+def annual_income(pay_periods, remuneration, F, deduction_employment_income, source_deduction_return):
+    return objects.AnnualIncome(pay_periods, remuneration, F, deduction_employment_income, source_deduction_return, 0).calculate()
+
+
+@node
+def income_tax_year(annual_income, K1, E, pay_periods, Q, Q1, pay_date):
+    return objects.IncomeTaxYear(I=annual_income, K1=K1, E=E, P=pay_periods, Q=Q, Q1=Q1, pay_date=pay_date).calculate()
+
+
+@node
+def income_tax_withheld_period(income_tax_year, pay_periods):
+    return objects.IncomeTaxWithheldPerPeriod(income_tax_year, pay_periods, 0).calculate()
+
+
+@node
+def quebec_pension_plan(remuneration, pay_periods, A5, pay_date):
+    return objects.QuebecPensionPlan(S3=remuneration, P=pay_periods, A5=A5, pay_date=pay_date).calculate()
+
+
+@node
+def quebec_parental_insurance_plan(remuneration, A6, pay_date):
+    return objects.QuebecParentalInsurancePlan(S4=remuneration, A6=A6, pay_date=pay_date).calculate()
+
+
+# Federal
+
+@node
+def annual_taxable_income(pay_periods, remuneration, quebec_pension_plan, F, U1):
+    return federal.AnnualTaxableIncome(P=pay_periods, I=remuneration, F=quebec_pension_plan + F, U1=U1).calculate()
+
+
+@node
+def employement_insurance(remuneration, ei_paid, pay_date):
+    return federal.EmployementInsurance(remuneration, paid_this_year=ei_paid, pay_date=pay_date).calculate()
+
+
+@node
+def basic_federal_tax(annual_taxable_income, TC, pay_periods, quebec_pension_plan, employement_insurance, remuneration, pay_date):
+    # IE: gains assurables de la periode, P x IE est annuel
+    return federal.BasicFederalTax(A=annual_taxable_income, TC=TC, P=pay_periods, C=quebec_pension_plan, AE=employement_insurance,
+                                   IE=remuneration, pay_date=pay_date).calculate()
+
+
+@node
+def annual_payable_tax_federal(basic_federal_tax, pay_date):
+    return federal.AnnualPayableTaxFederal(basic_federal_tax, pay_date=pay_date).calculate()
+
+
+@node
+def federal_tax_per_period(annual_payable_tax_federal, pay_periods):
+    return annual_payable_tax_federal / pay_periods
+
+
+@node
+def net_pay(remuneration, federal_tax_per_period, quebec_parental_insurance_plan, quebec_pension_plan, income_tax_withheld_period,
+            employement_insurance):
+    return (remuneration - federal_tax_per_period - quebec_parental_insurance_plan - quebec_pension_plan - income_tax_withheld_period
+            - employement_insurance)
+
+
+class Calculation():
+    """The chain for one employee, evaluated on demand.
+    The arguments are the inputs of batch.calculate_batch. calculation['net_pay'] calculates net_pay and
+    only the nodes it depends on, each one once; the inputs and the values calculated cannot be changed.
+    """
+    __slots__ = ('_values',)
+
+    def __init__(self, remuneration, pay_periods, remaining_periods, E, K1=0, Q=0, Q1=0, A5=0, A6=0, ei_paid=0,
+                 line_19=0, TC=0, pay_date=None, F=0, U1=0):
+        values = {'remuneration': remuneration, 'pay_periods': pay_periods, 'remaining_periods': remaining_periods, 'E': E,
+                  'K1': K1, 'Q': Q, 'Q1': Q1, 'A5': A5, 'A6': A6, 'ei_paid': ei_paid, 'line_19': line_19, 'TC': TC,
+                  'pay_date': pay_date, 'F': F, 'U1': U1}
+        object.__setattr__(self, '_values', values)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('a Calculation cannot be changed, create a new one')
+
+    def __getitem__(self, name):
+        values = self._values
+        if name in values:
+            return values[name]
+        if name not in NODES:
+            raise KeyError(name)
+        function, dependencies = NODES[name]
+        value = function(*[self[dependency] for dependency in dependencies])
+        values[name] = value
+        return value
+
+    def __contains__(self, name):
+        """True when name is an input or a node already calculated."""
+        return name in self._values
+
+    def get(self, *names):
+        """Values of the nodes names, as a read-only mapping."""
+        return types.MappingProxyType(dict((name, self[name]) for name in names))
+
+    def evaluated(self):
+        """Names of the nodes calculated so far."""
+        return tuple(name for name in self._values if name not in INPUTS)
+
+
+def evaluate(outputs, **inputs):
+    """Values of the outputs for one employee: evaluate(['net_pay'], remuneration=1464.56, ...)."""
+    return Calculation(**inputs).get(*outputs)
+
+
+def dependencies(name):
+    """Every node and input name depends on, directly or not."""
+    if name in INPUTS:
+        return set()
+    found = set()
+    for dependency in NODES[name][1]:
+        found.add(dependency)
+        found |= dependencies(dependency)
+    return found
@@ -0,0 +1,183 @@
+import federal
+import objects
+
+
+# Recalcul incremental d'une annee de paie. The results of every pay period of an employee are kept by
+# stage, with what each stage depends on:
+#   quebec        <- remuneration, retro_pay, line_19, authorized_deduction, E, K1, Q, Q1 of the period
+#   contributions <- remuneration and retro_pay of the period, contributions of the previous periods (A5, A6, EI paid)
+#   federal       <- remuneration, retro_pay, TC and contributions of the period
+# A retro pay is taxed as a non-periodic payment (objects.IncomeTaxOnNonPeriodicPayment and
+# federal.FederalTaxOnNonPeriodicPayment), it is only added to the remuneration for the contributions.
+#   net_pay       <- all of the above
+# Changing an input only recalculates the stages that depend on it, and the later periods only when the
+# contributions paid so far change what they can withhold.
+
+STAGES = ('quebec', 'contributions', 'federal')
+
+DEPENDENTS = {
+    'remuneration': ('quebec', 'contributions', 'federal'),
+    'line_19': ('quebec',),
+    'authorized_deduction': ('quebec',),
+    'E': ('quebec',),
+    'K1': ('quebec',),
+    'Q': ('quebec',),
+    'Q1': ('quebec',),
+    'TC': ('federal',),
+}
+
+# TP-1015.3-V line 19, TP-1016-V deductions and credits apply from the period they are received to the end
+# of the year, prorated over the periods remaining then: (P x amount) / Pr
+FROM_PERIOD = ('line_19', 'authorized_deduction', 'K1')
+# un nouveau TP-1015.3-V ou TD1 (E, TC) ou une nouvelle retenue pour des actions (Q, Q1) s'applique aussi
+# jusqu'a la fin de l'annee, sans prorata
+ONWARD = ('E', 'TC', 'Q', 'Q1')
+
+
+class EmployeeYear():
+    """Pay periods of one employee for one year, recalculated incrementally.
+    pay_periods = pay periods in the year (P), the period index k has P - k remaining periods
+    The other arguments are the starting values of the inputs in DEPENDENTS, received at period 0.
+    """
+    def __init__(self, pay_periods, E=0, K1=0, Q=0, Q1=0, TC=0, line_19=0, authorized_deduction=0, pay_date=None):
+        self.pay_periods = pay_periods
+        self.pay_date = pay_date
+        self.defaults = {'E': E, 'K1': K1, 'Q': Q, 'Q1': Q1, 'TC': TC, 'line_19': line_19,
+                         'authorized_deduction': authorized_deduction}
+        self.inputs = []
+        self.results = []
+        self.dirty = []
+        self.recalculated = dict((stage, 0) for stage in STAGES)
+
+    def __len__(self):
+        return len(self.inputs)
+
+    def add_period(self, remuneration, retro_pay=0, pay_date=None, **inputs):
+        """Pays the next period. Inputs not given keep their value of the previous period, an input of
+        FROM_PERIOD given with a new value is received at this period.
+        """
+        k = len(self.inputs)
+        if self.inputs:
+            values = dict(self.inputs[-1])
+            values['received'] = dict(values['received'])
+        else:
+            values = dict(self.defaults, received=dict.fromkeys(FROM_PERIOD, 0))
+        for name in FROM_PERIOD:
+            if name in inputs and inputs[name] != values[name]:
+                values['received'][name] = k
+        values.update(inputs)
+        values['remuneration'] = remuneration
+        values['retro_pay'] = retro_pay
+        values['pay_date'] = pay_date if pay_date is not None else self.pay_date
+        self.inputs.append(values)
+        self.results.append({})
+        self.dirty.append(set(STAGES))
+        return self.recalculate()[-1]
+
+    def set(self, period, name, value):
+        """Changes an input of one period (a retro pay amount, a correction of the remuneration...).
+        The inputs of FROM_PERIOD, received at period, and of ONWARD are changed from period to the end
+        of the year, like add_period would have carried them.
+        """
+        if name == 'retro_pay':
+            self.inputs[period]['retro_pay'] = value
+            self.dirty[period].update(DEPENDENTS['remuneration'])
+            return
+        if name not in DEPENDENTS:
+            raise KeyError('unknown input %s' % name)
+        periods = range(period, len(self.inputs)) if name in FROM_PERIOD or name in ONWARD else (period,)
+        for k in periods:
+            if self.inputs[k][name] != value:
+                self.inputs[k][name] = value
+                if name in FROM_PERIOD:
+                    self.inputs[k]['received'][name] = period
+                self.dirty[k].update(DEPENDENTS[name])
+
+    def recalculate(self):
+        """Recalculates the dirty stages and returns the results of every period."""
+        A5 = A6 = ei_paid = 0
+        for k, (values, results, dirty) in enumerate(zip(self.inputs, self.results, self.dirty)):
+            if 'contributions' not in dirty and results.get('paid_before') != (A5, A6, ei_paid):
+                dirty.add('contributions')
+            if dirty:
+                if 'quebec' in dirty:
+                    self._quebec(k, values, results)
+                if 'contributions' in dirty:
+                    before = (results.get('quebec_pension_plan'), results.get('quebec_parental_insurance_plan'),
+                              results.get('employement_insurance'), results.get('regular_contributions'))
+                    self._contributions(values, results, A5, A6, ei_paid)
+                    after = (results['quebec_pension_plan'], results['quebec_parental_insurance_plan'],
+                             results['employement_insurance'], results['regular_contributions'])
+                    if after != before:
+                        dirty.add('federal')
+                if 'federal' in dirty:
+                    self._federal(values, results)
+                results['net_pay'] = (self._gross(values) - results['federal_tax_per_period'] - results['federal_tax_on_retro_pay']
+                                      - results['quebec_parental_insurance_plan'] - results['quebec_pension_plan']
+                                      - results['income_tax_withheld_period'] - results['income_tax_on_retro_pay']
+                                      - results['employement_insurance'])
+                for stage in dirty:
+                    self.recalculated[stage] += 1
+                dirty.clear()
+            A5 += results['quebec_pension_plan']
+            A6 += results['quebec_parental_insurance_plan']
+            ei_paid += results['employement_insurance']
+        return self.results
+
+    def _gross(self, values):
+        return values['remuneration'] + values['retro_pay']
+
+    def _remaining(self, values, name):
+        # periodes restantes a la periode ou le montant a ete recu
+        return self.pay_periods - values['received'][name]
+
+    def _quebec(self, k, values, results):
+        P = self.pay_periods
+        remuneration = values['remuneration']
+        pay_date = values['pay_date']
+        deduction = objects.DeductionForEmploymentIncome(remuneration, P, pay_date).calculate()
+        source_deduction_return = objects.SourceDeductionReturn(P, values['line_19'], self._remaining(values, 'line_19')).calculate()
+        reduction = objects.ReductionSourceDeductions(P, values['authorized_deduction'],
+                                                      self._remaining(values, 'authorized_deduction')).calculate()
+        K1 = (P * values['K1']) / self._remaining(values, 'K1')
+        I = objects.AnnualIncome(P, remuneration, 0, deduction, source_deduction_return, reduction).calculate()
+        Y = objects.IncomeTaxYear(I=I, K1=K1, E=values['E'], P=P, Q=values['Q'], Q1=values['Q1'], pay_date=pay_date).calculate()
+        results['annual_income'] = I
+        results['income_tax_year'] = Y
+        results['income_tax_withheld_period'] = objects.IncomeTaxWithheldPerPeriod(Y, P).calculate()
+        retro_tax = 0
+        if values['retro_pay']:
+            retro_tax = objects.IncomeTaxOnNonPeriodicPayment(I, values['retro_pay'], K1=K1, E=values['E'], P=P, Q=values['Q'],
+                                                              Q1=values['Q1'], pay_date=pay_date).calculate()
+        results['income_tax_on_retro_pay'] = retro_tax
+
+    def _contributions(self, values, results, A5, A6, ei_paid):
+        P = self.pay_periods
+        pay_date = values['pay_date']
+        results['paid_before'] = (A5, A6, ei_paid)
+        paid = []
+        # sur la paie seule pour l'impot federal, puis sur la paie et la paie retroactive
+        for earnings in (values['remuneration'], self._gross(values)):
+            paid.append((objects.QuebecPensionPlan(S3=earnings, P=P, A5=A5, pay_date=pay_date).calculate(),
+                         objects.QuebecParentalInsurancePlan(S4=earnings, A6=A6, pay_date=pay_date).calculate(),
+                         federal.EmployementInsurance(earnings, paid_this_year=ei_paid, pay_date=pay_date).calculate()))
+        results['regular_contributions'] = paid[0]
+        (results['quebec_pension_plan'], results['quebec_parental_insurance_plan'],
+         results['employement_insurance']) = paid[1]
+
+    def _federal(self, values, results):
+        P = self.pay_periods
+        pay_date = values['pay_date']
+        qpp, _, ei = results['regular_contributions']
+        A = federal.AnnualTaxableIncome(P=P, I=values['remuneration'], F=qpp).calculate()
+        T3 = federal.BasicFederalTax(A=A, TC=values['TC'], P=P, C=qpp, AE=ei, IE=values['remuneration'], pay_date=pay_date).calculate()
+        T1 = federal.AnnualPayableTaxFederal(T3, pay_date=pay_date).calculate()
+        results['annual_taxable_income'] = A
+        results['basic_federal_tax'] = T3
+        results['annual_payable_tax_federal'] = T1
+        results['federal_tax_per_period'] = T1 / P
+        retro_tax = 0
+        if values['retro_pay']:
+            retro_tax = federal.FederalTaxOnNonPeriodicPayment(A, values['retro_pay'], P=P, C=qpp, AE=ei, IE=values['remuneration'],
+                                                               TC=values['TC'], pay_date=pay_date).calculate()
+        results['federal_tax_on_retro_pay'] = retro_tax
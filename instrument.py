@@ -0,0 +1,157 @@
+import collections
+import contextlib
+import cProfile
+import functools
+import importlib
+import inspect
+import logging
+import time
+
+
+# Compteurs et minuteries par etape. Nothing is measured until enable() is called: it replaces the
+# calculators and the pipeline stages by timed wrappers and disable() puts the originals back, so
+# the calculation code has no instrumentation cost when it is off. Inside the batch loops the parameter
+# lookups (rates.get) and the tax bracket lookups (tables.TaxTable.lookup, twice per employee) are stages
+# of their own, so a pay run shows where its time goes and not only batch.calculate_batch.
+
+logger = logging.getLogger(__name__)
+
+# (module, class or None, attribute) to time
+STAGES = [('objects', name, method) for name in ('AnnualIncome', 'DeductionForEmploymentIncome', 'SourceDeductionReturn',
+                                                 'ReductionSourceDeductions', 'IncomeTaxYear', 'IncomeTaxWithheldPerPeriod',
+                                                 'QuebecPensionPlan', 'QuebecParentalInsurancePlan')
+          for method in ('__init__', 'calculate')]
+STAGES += [('federal', name, method) for name in ('AnnualTaxableIncome', 'BasicFederalTax', 'AnnualPayableTaxFederal',
+                                                  'FederalTaxRate', 'EmployementInsurance')
+           for method in ('__init__', 'calculate')]
+STAGES += [
+    ('rates', None, 'get'),
+    ('tables', 'TaxTable', 'lookup'),
+    ('batch', None, 'calculate_batch'),
+    ('batch', None, 'calculate_bonus_batch'),
+    ('money', None, 'calculate_batch'),
+    ('cache', 'WithholdingCache', 'calculate_batch'),
+    ('simulation', None, 'project'),
+    ('employe', 'EmployeeTable', 'calculate'),
+    ('ytd', 'YearToDate', 'get_many'),
+    ('ytd', 'YearToDate', 'add_many'),
+    ('ytd', 'ContributionLedger', 'get_many'),
+    ('ytd', 'ContributionLedger', 'add_many'),
+    ('pipeline', None, '_read_csv'),
+    ('pipeline', None, '_read_parquet'),
+    ('pipeline', None, 'to_columns'),
+    ('pipeline', None, 'process'),
+    ('pipeline', 'CsvWriter', 'write'),
+    ('pipeline', 'ParquetWriter', 'write'),
+]
+
+
+class Timings():
+    """Calls and seconds per stage, 'IncomeTaxYear.__init__' or 'batch.calculate_batch' for example.
+    The seconds of a stage include the stages it calls.
+    """
+    def __init__(self):
+        self.calls = collections.Counter()
+        self.seconds = collections.defaultdict(float)
+
+    def add(self, name, seconds):
+        self.calls[name] += 1
+        self.seconds[name] += seconds
+
+    def report(self):
+        lines = ['%-45s %10s %10s %12s' % ('stage', 'calls', 'seconds', 'us/call')]
+        for name, seconds in sorted(self.seconds.items(), key=lambda item: -item[1]):
+            lines.append('%-45s %10d %10.3f %12.2f' % (name, self.calls[name], seconds, 1e6 * seconds / self.calls[name]))
+        return '\n'.join(lines)
+
+
+_originals = {}
+timings = None
+
+
+def _timed(name, function, timings):
+    # timings est celui de enable(): un appel qui finit apres disable() ne touche pas le suivant
+    timer = time.perf_counter
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = timer()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            timings.add(name, timer() - start)
+    return wrapper
+
+
+def _timed_generator(name, function, timings):
+    # le temps d'un generateur est celui passe dans chaque next()
+    timer = time.perf_counter
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        iterator = function(*args, **kwargs)
+        while True:
+            start = timer()
+            try:
+                value = next(iterator)
+            except StopIteration:
+                timings.add(name, timer() - start)
+                return
+            timings.add(name, timer() - start)
+            yield value
+    return wrapper
+
+
+def enable():
+    """Starts timing every stage in STAGES and returns the Timings they are added to."""
+    global timings
+    if timings is None:
+        timings = Timings()
+    for module_name, class_name, attribute in STAGES:
+        key = (module_name, class_name, attribute)
+        if key in _originals:
+            continue
+        owner = importlib.import_module(module_name)
+        if class_name is not None:
+            owner = getattr(owner, class_name)
+        function = owner.__dict__[attribute]
+        name = '%s.%s' % (class_name or module_name, attribute)
+        wrap = _timed_generator if inspect.isgeneratorfunction(function) else _timed
+        _originals[key] = (owner, function)
+        setattr(owner, attribute, wrap(name, function, timings))
+    importlib.import_module('objects').logger = logging.getLogger('objects')
+    return timings
+
+
+def disable():
+    """Puts the original functions back and returns the Timings collected since enable()."""
+    global timings
+    for (module_name, class_name, attribute), (owner, function) in _originals.items():
+        setattr(owner, attribute, function)
+    _originals.clear()
+    importlib.import_module('objects').logger = None
+    collected, timings = timings, None
+    return collected
+
+
+@contextlib.contextmanager
+def timed():
+    """with instrument.timed() as timings: ... times the stages of one run."""
+    collected = enable()
+    try:
+        yield collected
+    finally:
+        disable()
+        logger.info('stage timings\n%s', collected.report())
+
+
+@contextlib.contextmanager
+def profile(path):
+    """Runs the block under cProfile and writes the statistics to path (see pstats)."""
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
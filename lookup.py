@@ -0,0 +1,161 @@
+import argparse
+import array
+import struct
+import sys
+
+import batch
+import rates
+
+
+# Tables de retenues precalculees (comme WebRAS et les tables de la CRA). The formulas are calculated once
+# over a grid of salaries for each pay frequency and claim amount and kept in a binary file. A lookup
+# interpolates between the two nearest salaries of the grid. The formulas are piecewise linear, so the
+# interpolation is exact except around a bracket or a maximum: the intervals where it could be off by
+# more than 2 * TOLERANCE are marked when the table is generated. Those intervals, salaries outside of the
+# grid and pays with inputs that the tables do not cover use the exact formulas.
+
+FIELDS = ('income_tax_withheld_period', 'federal_tax_per_period', 'quebec_pension_plan',
+          'quebec_parental_insurance_plan', 'employement_insurance', 'net_pay')
+
+MAGIC = b'PQWT'
+VERSION = 1
+# largest error allowed at the middle of an interval, the error anywhere in it is at most twice that
+TOLERANCE = 0.001
+# magic, version, pay periods, E, TC, start, step, count, effective date (ordinal)
+HEADER = struct.Struct('<4sHHddddII')
+
+
+class WithholdingTable():
+    """Deductions for one pay frequency (pay_periods) and claim amounts (E for Quebec, TC for federal),
+    at the salaries start, start + step, ... start + (count - 1) * step.
+    values = dict of array('d') keyed by FIELDS
+    exact = array('b'), 1 for the intervals [i, i + 1] that must use the exact formulas
+    """
+    def __init__(self, pay_periods, E, TC, start, step, count, effective, values, exact):
+        self.pay_periods = pay_periods
+        self.E = E
+        self.TC = TC
+        self.start = start
+        self.step = step
+        self.count = count
+        self.effective = effective
+        self.stop = start + (count - 1) * step
+        self.values = values
+        self.exact = exact
+        # colonnes dans l'ordre de FIELDS pour lookup
+        self.columns = [values[name] for name in FIELDS]
+
+    @property
+    def key(self):
+        return (self.pay_periods, self.E, self.TC)
+
+    @classmethod
+    def generate(cls, pay_periods, E, TC=0, start=0, stop=5000, step=1, pay_date=None):
+        count = int(round((stop - start) / step)) + 1
+        salaries = [start + i * step for i in range(count)]
+        results = batch.calculate_batch(salaries, pay_periods, pay_periods, E, TC=TC, pay_date=pay_date)
+        values = dict((name, array.array('d', results[name])) for name in FIELDS)
+        middles = batch.calculate_batch([salary + step / 2 for salary in salaries[:-1]], pay_periods, pay_periods, E, TC=TC, pay_date=pay_date)
+        exact = array.array('b', [0] * count)
+        for name in FIELDS:
+            column, middle = values[name], middles[name]
+            for i in range(count - 1):
+                if abs((column[i] + column[i + 1]) / 2 - middle[i]) > TOLERANCE:
+                    exact[i] = 1
+        return cls(pay_periods, E, TC, start, step, count, rates.get(pay_date).effective.toordinal(), values, exact)
+
+    def lookup(self, remuneration):
+        """Deductions for a salary of the grid range, as a tuple in the order of FIELDS.
+        None outside of the grid or in an interval marked exact.
+        """
+        position = (remuneration - self.start) / self.step
+        if position < 0 or remuneration > self.stop:
+            return None
+        i = int(position)
+        fraction = position - i
+        if fraction == 0:
+            return tuple([column[i] for column in self.columns])
+        if self.exact[i]:
+            return None
+        return tuple([column[i] + (column[i + 1] - column[i]) * fraction for column in self.columns])
+
+    def write(self, f):
+        f.write(HEADER.pack(MAGIC, VERSION, self.pay_periods, self.E, self.TC, self.start, self.step, self.count, self.effective))
+        for name in FIELDS:
+            self.values[name].tofile(f)
+        self.exact.tofile(f)
+
+    @classmethod
+    def read(cls, f):
+        header = f.read(HEADER.size)
+        if not header:
+            return None
+        magic, version, pay_periods, E, TC, start, step, count, effective = HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('not a withholding table file (version %s)' % VERSION)
+        values = {}
+        for name in FIELDS:
+            values[name] = array.array('d')
+            values[name].fromfile(f, count)
+        exact = array.array('b')
+        exact.fromfile(f, count)
+        return cls(pay_periods, E, TC, start, step, count, effective, values, exact)
+
+
+def save(path, tables):
+    with open(path, 'wb') as f:
+        for table in tables:
+            table.write(f)
+
+
+def load(path):
+    """Tables of a file, keyed by (pay_periods, E, TC)."""
+    tables = {}
+    with open(path, 'rb') as f:
+        while True:
+            table = WithholdingTable.read(f)
+            if table is None:
+                break
+            tables[table.key] = table
+    return tables
+
+
+def withholding(tables, remuneration, pay_periods, E, TC=0, pay_date=None, **inputs):
+    """Deductions of one pay as a dict keyed by FIELDS, from the tables when possible.
+    inputs = other arguments of batch.calculate_batch (K1, Q, A5...). When one of them is not zero, or when
+    there is no table for (pay_periods, E, TC) in effect on pay_date, or the salary is outside of the grid,
+    the exact formulas are used.
+    """
+    remaining_periods = inputs.pop('remaining_periods', pay_periods)
+    table = tables.get((pay_periods, E, TC))
+    if table is not None and not any(inputs.values()) and table.effective == rates.get(pay_date).effective.toordinal():
+        values = table.lookup(remuneration)
+        if values is not None:
+            return dict(zip(FIELDS, values))
+    results = batch.calculate_batch([remuneration], pay_periods, remaining_periods, E, TC=TC, pay_date=pay_date, **inputs)
+    return dict((name, results[name][0]) for name in FIELDS)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate withholding lookup tables.')
+    parser.add_argument('output', help='binary file for the tables')
+    parser.add_argument('--pay-periods', type=int, nargs='+', default=[52, 26, 24, 12])
+    parser.add_argument('--claims', type=float, nargs='+', default=[15532], help='Quebec personal credits E')
+    parser.add_argument('--federal-claims', type=float, nargs='+', default=[0], help='federal claim amounts TC')
+    parser.add_argument('--annual-max', type=float, default=250000, help='highest annual salary of the grid')
+    parser.add_argument('--step', type=float, default=1, help='grid step in dollars per pay')
+    parser.add_argument('--pay-date', default=None)
+    args = parser.parse_args(argv)
+
+    tables = []
+    for pay_periods in args.pay_periods:
+        for E in args.claims:
+            for TC in args.federal_claims:
+                tables.append(WithholdingTable.generate(pay_periods, E, TC, 0, args.annual_max / pay_periods, args.step, args.pay_date))
+    save(args.output, tables)
+    print('%d tables, %d salaries, %d exact intervals' % (len(tables), sum(table.count for table in tables),
+                                                        sum(sum(table.exact) for table in tables)), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
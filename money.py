@@ -0,0 +1,378 @@
+import itertools
+
+import batch
+import federal
+import objects
+import rates
+import tables
+
+
+# Calcul exact en cents. Amounts are integers of cents and rates integers of millionths, so every step is
+# exact integer arithmetic. Each formula step (one class of objects.py or federal.py) rounds its result to
+# the nearest cent, half up, instead of carrying binary float errors to the next step.
+
+RATE_SCALE = 1000000
+HALF = RATE_SCALE // 2
+
+
+def to_cents(amount):
+    """Dollars (int, float or str) -> cents, rounded half away from zero."""
+    if isinstance(amount, int):
+        return amount * 100
+    if isinstance(amount, str):
+        sign = -1 if amount.startswith('-') else 1
+        whole, _, fraction = amount.lstrip('+-').partition('.')
+        fraction = (fraction + '000')[:3]
+        thousandths = int(whole or 0) * 1000 + int(fraction)
+        return sign * ((thousandths + 5) // 10)
+    text = repr(float(amount))
+    if 'e' in text:
+        text = format(amount, '.3f')
+    return to_cents(text)
+
+
+def to_dollars(cents):
+    return cents / 100
+
+
+def divide(n, d):
+    """n / d rounded to the nearest integer, half up, d > 0."""
+    return (2 * n + d) // (2 * d)
+
+
+def multiply(cents, rate):
+    """cents × rate rounded to the cent, half up, rate in millionths."""
+    return (cents * rate + HALF) // RATE_SCALE
+
+
+def to_rate(rate):
+    """Rate -> millionths."""
+    return round(rate * RATE_SCALE)
+
+
+# credits of IncomeTaxYear: 0.15 for E and Q, 0.20 for Q1
+QUEBEC_CREDIT_RATE = to_rate(0.15)
+FONDACTION_CREDIT_RATE = to_rate(0.20)
+
+
+class Parameters():
+    """rates.Parameters converted to cents and millionths."""
+    def __init__(self, parameters):
+        self.effective = parameters.effective
+        self.qpp_rate = to_rate(parameters.qpp_rate)
+        self.qpp_exemption = to_cents(parameters.qpp_exemption)
+        self.qpp_max = to_cents(parameters.qpp_max)
+        self.qpip_rate = to_rate(parameters.qpip_rate)
+        self.qpip_max = to_cents(parameters.qpip_max)
+        self.ei_rate = to_rate(parameters.ei_rate)
+        self.ei_max = to_cents(parameters.ei_max)
+        self.employment_deduction_rate = to_rate(parameters.employment_deduction_rate)
+        self.employment_deduction_max = to_cents(parameters.employment_deduction_max)
+        self.credit_rate = to_rate(parameters.federal_credit_rate)
+        self.federal_lcf = to_cents(parameters.federal_lcf)
+        self.federal_cea = to_cents(parameters.federal_cea)
+        self.quebec_abatement = to_rate(parameters.quebec_abatement)
+        self.quebec = tables.TaxTable(_brackets(parameters.values['quebec_brackets']))
+        self.federal = tables.TaxTable(_brackets(parameters.values['federal_brackets']))
+
+
+def _brackets(rows):
+    return [{'min': to_cents(row[0]), 'max': to_cents(row[1]), 'income_tax_rate': to_rate(row[2]), 'constant_k': to_cents(row[3])}
+            for row in rows]
+
+
+_parameters = {}
+
+
+def _converted(parameters):
+    if parameters.effective not in _parameters:
+        _parameters[parameters.effective] = Parameters(parameters)
+    return _parameters[parameters.effective]
+
+
+def get(pay_date=None):
+    """Parameters in cents in effect on pay_date."""
+    return _converted(rates.get(pay_date))
+
+
+# Les classes de objects.py et federal.py en cents. Same arguments, every amount in integer cents (the
+# defaults taken from the rates too); chained like in app.py they give what calculate_batch gives.
+# AnnualIncome and AnnualTaxableIncome only add and multiply, they are already exact on integers.
+
+AnnualIncome = objects.AnnualIncome
+AnnualTaxableIncome = federal.AnnualTaxableIncome
+
+
+class DeductionForEmploymentIncome(objects.DeductionForEmploymentIncome):
+    def __init__(self, remuneration, pay_periods, pay_date=None):
+        super().__init__(remuneration, pay_periods, pay_date)
+        self.parameters = _converted(self.parameters)
+
+    def calculate(self):
+        result = multiply(self.remuneration, self.parameters.employment_deduction_rate)
+        maximum = divide(self.parameters.employment_deduction_max, self.pay_periods)
+        if result > maximum:
+            result = maximum
+        return result
+
+
+class SourceDeductionReturn(objects.SourceDeductionReturn):
+    def calculate(self):
+        return divide(self.pay_periods * self.line_19, self.remaining_periods)
+
+
+class ReductionSourceDeductions(objects.ReductionSourceDeductions):
+    def calculate(self):
+        return divide(self.pay_periods * self.authorized_deduction, self.remaining_periods)
+
+
+class IncomeTaxYear(objects.IncomeTaxYear):
+    """Y = (T × I) – K – K1 – (0.15 × E) – (0.15 × P × Q) – (0.20 × P × Q1), rounded once."""
+    def get_income_tax_rate(self):
+        self.parameters = _converted(self.parameters)
+        super().get_income_tax_rate()
+
+    def calculate(self):
+        return ((self.I * self.T - self.E * QUEBEC_CREDIT_RATE - self.P * self.Q * QUEBEC_CREDIT_RATE
+                 - self.P * self.Q1 * FONDACTION_CREDIT_RATE + HALF) // RATE_SCALE - self.K - self.K1)
+
+
+class IncomeTaxWithheldPerPeriod(objects.IncomeTaxWithheldPerPeriod):
+    def calculate(self):
+        return divide(self.income_tax_year, self.pay_periods) + self.additional_source_deduction
+
+
+class QuebecPensionPlan(objects.QuebecPensionPlan):
+    def __init__(self, S3, V=None, P=52, M=None, A5=0, pay_date=None):
+        self.parameters = get(pay_date)
+        self.S3 = S3
+        self.V = V if V is not None else self.parameters.qpp_exemption
+        self.P = P
+        self.M = M if M is not None else self.parameters.qpp_max
+        self.A5 = A5
+
+    def calculate(self):
+        result = multiply(self.S3 - divide(self.V, self.P), self.parameters.qpp_rate)
+        A5 = self.A5
+        if A5 >= self.M:
+            A5 = self.M
+        if result > (self.M - A5):
+            result = (self.M - A5)
+        return result
+
+
+class QuebecParentalInsurancePlan(objects.QuebecParentalInsurancePlan):
+    def __init__(self, S4, N=None, A6=0, pay_date=None):
+        self.parameters = get(pay_date)
+        self.S4 = S4
+        self.N = N if N is not None else self.parameters.qpip_max
+        self.A6 = A6
+
+    def calculate(self):
+        result = multiply(self.S4, self.parameters.qpip_rate)
+        A6 = self.A6
+        if A6 >= self.N:
+            A6 = self.N
+        if result > (self.N - A6):
+            result = (self.N - A6)
+        return result
+
+
+class EmployementInsurance(federal.EmployementInsurance):
+    def __init__(self, insurable_earning, premium_rate=None, year_max=None, paid_this_year=0, pay_date=None):
+        parameters = get(pay_date)
+        self.insurable_earning = insurable_earning
+        self.premium_rate = premium_rate if premium_rate is not None else parameters.ei_rate
+        self.year_max = year_max if year_max is not None else parameters.ei_max
+        self.paid_this_year = paid_this_year
+
+    def calculate(self):
+        result = multiply(self.insurable_earning, self.premium_rate)
+        year_max = self.year_max
+        if year_max <= self.paid_this_year:
+            year_max = self.paid_this_year
+        if result > (year_max - self.paid_this_year):
+            result = year_max - self.paid_this_year
+        return result
+
+
+class BasicFederalTax(federal.BasicFederalTax):
+    """T3 = (R × A) – K – K1 – K2Q – K3 – K4, the credits K1, K2Q and K4 rounded once with R × A."""
+    def __init__(self, R=None, A=0, K=None, K1=0, K2Q=0, K3=0, K4=0, TC=0, P=52, C=0, AE=0, IE=0, CEA=None, pay_date=None):
+        self.parameters = parameters = get(pay_date)
+        self.A = A
+        self.R, self.K = parameters.federal.lookup(self.A)
+        if R is not None:
+            self.R = R
+        if K is not None:
+            self.K = K
+        self.K3 = K3
+        self.TC = TC
+        self.P = P
+        self.C = C
+        self.AE = AE
+        self.IE = IE
+        self.CEA = CEA if CEA is not None else parameters.federal_cea
+        self.P_C = min(self.P * self.C, parameters.qpp_max)
+        self.P_AE = min(self.P * self.AE, parameters.ei_max)
+        self.P_IE = min(multiply(self.P * self.IE, parameters.qpip_rate), parameters.qpip_max)
+
+    def calculate(self):
+        # montants des credits, au taux des credits
+        claims = self.TC + self.P_C + self.P_AE + self.P_IE + min(self.A, self.CEA)
+        result = (self.R * self.A - claims * self.parameters.credit_rate + HALF) // RATE_SCALE - self.K - self.K3
+        if result < 0:
+            result = 0
+        return result
+
+
+class AnnualPayableTaxFederal(federal.AnnualPayableTaxFederal):
+    def __init__(self, T3, LCF=None, pay_date=None):
+        self.parameters = get(pay_date)
+        self.T3 = T3
+        self.LCF = LCF if LCF is not None else self.parameters.federal_lcf
+
+    def calculate(self):
+        self.T3_LCF = self.T3 - self.LCF
+        if self.T3_LCF < 0:
+            self.T3_LCF = 0
+        result = self.T3_LCF - multiply(self.T3, self.parameters.quebec_abatement)
+        if result < 0:
+            result = 0
+        return result
+
+
+class FederalTaxRate(federal.FederalTaxRate):
+    def calculate(self):
+        return divide(self.T1, self.P) + self.L
+
+
+def calculate(remuneration, pay_periods, remaining_periods, E, outputs=('net_pay',), **inputs):
+    """app.calculate in cents: the outputs of one employee, every amount in integer cents."""
+    results = calculate_batch(remuneration, pay_periods, remaining_periods, E, **inputs)
+    return dict((name, results[name][0]) for name in outputs)
+
+
+def calculate_batch(remuneration, pay_periods, remaining_periods, E, K1=0, Q=0, Q1=0,
+                    A5=0, A6=0, ei_paid=0, line_19=0, TC=0, pay_date=None, F=0, U1=0):
+    """Same as batch.calculate_batch with every amount in integer cents, inputs and results.
+    One employee is calculate(...), or a batch of one.
+    Each step is rounded to the cent where the float path keeps every binary digit, so the results
+    differ from batch.calculate_batch by a few cents: up to 2.31 cents on net_pay, 0.71 on the federal
+    tax and 0.63 on the Quebec tax over 100 000 random employees of the 2020 rates. They are equal
+    to the cents classes above chained like in app.py.
+    """
+    size = batch._size(remuneration, pay_periods, remaining_periods, E, K1, Q, Q1, A5, A6, ei_paid, line_19, TC, pay_date, F, U1)
+    column = batch._column
+    quebec_credit, fondaction_credit = QUEBEC_CREDIT_RATE, FONDACTION_CREDIT_RATE
+    # multiply() et divide() sont ecrits en ligne dans la boucle: (x * rate + H) // S et (2 * n + d) // (2 * d);
+    # what depends only on the pay date or on P is computed when they change, not for every employee
+    H, S = HALF, RATE_SCALE
+    results = dict((name, []) for name in batch.OUTPUTS)
+    # un append par resultat, appele directement: pas de zip ni de boucle interne par employe
+    (dei_out, sdr_out, I_out, Y_out, A_qc_out, qpp_out, qpip_out, A_out, ei_out, T3_out, T1_out, federal_tax_out,
+     net_out) = [results[name].append for name in batch.OUTPUTS]
+
+    last_day = last_P = object() # jamais egal a une date de paie ni a P
+    rows = zip(column(remuneration), column(pay_periods), column(remaining_periods), column(E),
+               column(K1), column(Q), column(Q1), column(A5), column(A6), column(ei_paid),
+               column(line_19), column(TC), column(pay_date), column(F), column(U1))
+    for rem, P, Pr, e, k1, q, q1, a5, a6, ei_so_far, l19, tc, day, f, u1 in itertools.islice(rows, size):
+        if day != last_day:
+            parameters = get(day)
+            last_day = day
+            last_P = object()
+            qpp_rate, V, M = parameters.qpp_rate, parameters.qpp_exemption, parameters.qpp_max
+            qpip_rate, N = parameters.qpip_rate, parameters.qpip_max
+            ei_rate, ei_max = parameters.ei_rate, parameters.ei_max
+            ded_rate, ded_max = parameters.employment_deduction_rate, parameters.employment_deduction_max
+            LCF, CEA, credit = parameters.federal_lcf, parameters.federal_cea, parameters.credit_rate
+            abatement = parameters.quebec_abatement
+            income_tax_rate = parameters.quebec.lookup
+            federal_tax_rate = parameters.federal.lookup
+        if P != last_P:
+            last_P = P
+            P2 = 2 * P
+            ded_per_period = (2 * ded_max + P) // P2
+            V_per_period = (2 * V + P) // P2
+            P_quebec_credit, P_fondaction_credit, P_qpip_rate = P * quebec_credit, P * fondaction_credit, P * qpip_rate
+
+        # Quebec
+        dei = (rem * ded_rate + H) // S
+        if dei > ded_per_period:
+            dei = ded_per_period
+        sdr = (2 * P * l19 + Pr) // (2 * Pr) if l19 else 0
+        I = P * (rem - f - dei) - sdr
+        T, K_qc = income_tax_rate(I)
+        Y = (I * T - e * quebec_credit - q * P_quebec_credit - q1 * P_fondaction_credit + H) // S - K_qc - k1
+        A_qc = (2 * Y + P) // P2
+
+        qpp = ((rem - V_per_period) * qpp_rate + H) // S
+        if a5 >= M:
+            a5 = M
+        if qpp > M - a5:
+            qpp = M - a5
+
+        qpip = (rem * qpip_rate + H) // S
+        if a6 >= N:
+            a6 = N
+        if qpip > N - a6:
+            qpip = N - a6
+
+        # Federal
+        A = P * (rem - (qpp + f) - u1)
+        if A <= 0:
+            A = 0
+
+        ei = (rem * ei_rate + H) // S
+        year_max = ei_max
+        if year_max <= ei_so_far:
+            year_max = ei_so_far
+        if ei > year_max - ei_so_far:
+            ei = year_max - ei_so_far
+
+        P_C = P * qpp
+        if P_C > M:
+            P_C = M
+        P_AE = P * ei
+        if P_AE > ei_max:
+            P_AE = ei_max
+        P_IE = (rem * P_qpip_rate + H) // S
+        if P_IE > N:
+            P_IE = N
+        R, K = federal_tax_rate(A)
+        # K1 + K2Q + K4 au taux des credits, arrondis avec R × A
+        claims = tc + P_C + P_AE + P_IE
+        if A < CEA:
+            claims += A
+        else:
+            claims += CEA
+        T3 = (A * R - claims * credit + H) // S - K
+        if T3 < 0:
+            T3 = 0
+
+        T3_LCF = T3 - LCF
+        if T3_LCF < 0:
+            T3_LCF = 0
+        T1 = T3_LCF - (T3 * abatement + H) // S
+        if T1 < 0:
+            T1 = 0
+        federal_tax = (2 * T1 + P) // P2
+
+        net = rem - federal_tax - qpip - qpp - A_qc - ei
+
+        dei_out(dei)
+        sdr_out(sdr)
+        I_out(I)
+        Y_out(Y)
+        A_qc_out(A_qc)
+        qpp_out(qpp)
+        qpip_out(qpip)
+        A_out(A)
+        ei_out(ei)
+        T3_out(T3)
+        T1_out(T1)
+        federal_tax_out(federal_tax)
+        net_out(net)
+
+    return results
@@ -1,4 +1,9 @@
-import constant
+import rates
+
+
+# logging.Logger de instrument.enable(): importing logging would double the cold start of a short-lived
+# process, so the calculators only log while the instrumentation is on.
+logger = None
 
 
 class AnnualIncome():
@@ -48,16 +53,18 @@ class AnnualIncome():
 class DeductionForEmploymentIncome():
     """docstring for DeductionForEmploymentIncome
     Gross salary or wages subject to source deductions of income tax for the pay period.
-         Do not include gratuities, retroactive pay or similar lump-sum payments."""
+         Do not include gratuities, retroactive pay or similar lump-sum payments.
+    pay_date = date of the pay, selects the rates (see rates.get)"""
 
-    def __init__(self, remuneration, pay_periods):
+    def __init__(self, remuneration, pay_periods, pay_date=None):
         self.remuneration = remuneration
         self.pay_periods = pay_periods
+        self.parameters = rates.get(pay_date)
     
     def calculate(self):
-        result = (0.06* self.remuneration) 
-        if result > (1190 / self.pay_periods):
-            result = 1190 / self.pay_periods
+        result = (self.parameters.employment_deduction_rate * self.remuneration) 
+        if result > (self.parameters.employment_deduction_max / self.pay_periods):
+            result = self.parameters.employment_deduction_max / self.pay_periods
         return result
 
 class SourceDeductionReturn():
@@ -133,9 +140,11 @@ class IncomeTaxYear():
         The total of the amounts withheld for the year must not exceed $5,000. For the pay period in which the
         annual maximum is reached, the value of variables Q and Q1
          must be zero.
+    pay_date = date of the pay, selects the tax table (see rates.get)
     """
 
-    def __init__(self, I, K1=0, E=0, P=52, Q=0, Q1=0):
+    def __init__(self, I, K1=0, E=0, P=52, Q=0, Q1=0, pay_date=None):
+        self.parameters = rates.get(pay_date)
         self.I = I
         self.K1 = K1
         self.E = E
@@ -145,17 +154,43 @@ class IncomeTaxYear():
         self.get_income_tax_rate()
 
     def get_income_tax_rate(self):
-        for element in constant.INCOME_TAX_RATE_APPLICABLE:
-            if element['min'] < self.I and element['max'] >= self.I:
-                self.T = element['income_tax_rate']
-                self.K = element['constant_k']
-                print('income tax rate set to %s' %self.T)
-                break
+        self.T, self.K = self.parameters.quebec.lookup(self.I)
+        if logger is not None:
+            logger.debug('income tax rate set to %s', self.T)
 
     
     def calculate(self):
         # Y = (T × I) – K – K1 – (0.15 × E) – (0.15 × P × Q) – (0.20 × P × Q1) I
-        result = (self.T * self.I) - self.K - self.K1 - (0.15 * self.E) - (0.15 * self.P * self.Q) - (0.20 * self.P * self.Q1) * self.I
+        result = (self.T * self.I) - self.K - self.K1 - (0.15 * self.E) - (0.15 * self.P * self.Q) - (0.20 * self.P * self.Q1)
+        return result
+
+class IncomeTaxOnNonPeriodicPayment():
+    """Income tax to withhold on a bonus, retroactive pay or other lump-sum payment B
+    = Y(I + B) – Y(I), at least 0, the income tax for the year with and without the payment (each at least 0)
+    I = Annual income without the payment (AnnualIncome)
+    B = Payment, less the contributions deducted from it (RPP, RRSP...)
+    K1, E, P, Q, Q1 = see IncomeTaxYear
+    """
+    def __init__(self, I, B, K1=0, E=0, P=52, Q=0, Q1=0, pay_date=None):
+        self.I = I
+        self.B = B
+        self.K1 = K1
+        self.E = E
+        self.P = P
+        self.Q = Q
+        self.Q1 = Q1
+        self.pay_date = pay_date
+
+    def income_tax_year(self, I):
+        result = IncomeTaxYear(I, self.K1, self.E, self.P, self.Q, self.Q1, self.pay_date).calculate()
+        if result < 0:
+            result = 0
+        return result
+
+    def calculate(self):
+        result = self.income_tax_year(self.I + self.B) - self.income_tax_year(self.I)
+        if result < 0:
+            result = 0
         return result
 
 class IncomeTaxWithheldPerPeriod():
@@ -181,38 +216,43 @@ class IncomeTaxWithheldPerPeriod():
 class QuebecPensionPlan():
     """Q = Employee’s QPP contribution to be withheld for the pay period
          = 0.0570 × [S3 – (V / P)], up to a maximum of M – A5
+    V (exemption) and M (maximum) default to the values in effect on pay_date
     """
-    def __init__(self, S3, V, P, M, A5):
+    def __init__(self, S3, V=None, P=52, M=None, A5=0, pay_date=None):
+        self.parameters = rates.get(pay_date)
         self.S3 = S3
-        self.V = V
+        self.V = V if V is not None else self.parameters.qpp_exemption
         self.P = P
-        self.M = M
+        self.M = M if M is not None else self.parameters.qpp_max
         self.A5 = A5
 
     def calculate(self):
-        result = 0.0570 * (self.S3 - (self.V / self.P))
-        if self.A5 >= self.M:
-            self.A5 = self.M
-        if result > (self.M - self.A5):
-            result = (self.M - self.A5)
+        result = self.parameters.qpp_rate * (self.S3 - (self.V / self.P))
+        A5 = self.A5
+        if A5 >= self.M:
+            A5 = self.M
+        if result > (self.M - A5):
+            result = (self.M - A5)
 
         return result
 
 class QuebecParentalInsurancePlan():
     """Ap = = (0.00494 × S4), up to a maximum of N – A6
-
+    N (maximum) defaults to the value in effect on pay_date
     """
-    def __init__(self, S4, N, A6):
+    def __init__(self, S4, N=None, A6=0, pay_date=None):
+        self.parameters = rates.get(pay_date)
         self.S4 = S4
-        self.N = N
+        self.N = N if N is not None else self.parameters.qpip_max
         self.A6 = A6
     
     def calculate(self):
-        result = (0.00494 * self.S4)
-        if self.A6 >= self.N:
-            self.A6 = self.N
-        if result > (self.N - self.A6):
-            result = (N - A6)
+        result = (self.parameters.qpip_rate * self.S4)
+        A6 = self.A6
+        if A6 >= self.N:
+            A6 = self.N
+        if result > (self.N - A6):
+            result = (self.N - A6)
 
 
         return result
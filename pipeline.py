@@ -0,0 +1,188 @@
+import argparse
+import contextlib
+import csv
+import sys
+import time
+
+import batch
+
+
+# Lecture d'un fichier de paies (CSV ou Parquet) par blocs, calcul en lot et ecriture au fur et a mesure.
+# Columns read from the input file. remuneration, pay_periods, remaining_periods and E are required,
+# the others take the default value below when missing. employee_id is copied to the output if present.
+REQUIRED = ('remuneration', 'pay_periods', 'remaining_periods', 'E')
+OPTIONAL = {'K1': 0, 'Q': 0, 'Q1': 0, 'A5': 0, 'A6': 0, 'ei_paid': 0, 'line_19': 0, 'TC': 0, 'pay_date': None, 'F': 0, 'U1': 0}
+INTEGERS = ('pay_periods', 'remaining_periods')
+DEFAULT_CHUNK_SIZE = 10000
+
+
+def _is_parquet(path):
+    return path.endswith('.parquet')
+
+
+def _read_csv(path, chunk_size):
+    with open(path, newline='') as f:
+        chunk = []
+        for row in csv.DictReader(f):
+            chunk.append(row)
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def _read_parquet(path, chunk_size):
+    import pyarrow.parquet
+
+    for record_batch in pyarrow.parquet.ParquetFile(path).iter_batches(batch_size=chunk_size):
+        yield record_batch.to_pylist()
+
+
+def read_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Rows of a CSV or Parquet file, chunk_size rows at a time, as lists of dicts."""
+    if _is_parquet(path):
+        return _read_parquet(path, chunk_size)
+    return _read_csv(path, chunk_size)
+
+
+def to_columns(rows):
+    """List of pay records (dicts) -> keyword arguments for batch.calculate_batch.
+    A blank or missing optional value takes the default of OPTIONAL for that record only.
+    Raises ValueError for a missing required column or a value that is not a number.
+    """
+    columns = {}
+    for name in REQUIRED:
+        convert = int if name in INTEGERS else float
+        try:
+            columns[name] = [convert(row[name]) for row in rows]
+        except KeyError:
+            raise ValueError('missing column %s' % name)
+        except (TypeError, ValueError):
+            raise ValueError('invalid value for %s' % name)
+    for name, default in OPTIONAL.items():
+        convert = str if name == 'pay_date' else float
+        values = [row.get(name) for row in rows]
+        if all(value in ('', None) for value in values):
+            # colonne absente partout: une seule valeur pour tout le bloc
+            columns[name] = default
+            continue
+        try:
+            columns[name] = [default if value in ('', None) else convert(value) for value in values]
+        except (TypeError, ValueError):
+            raise ValueError('invalid value for %s' % name)
+    return columns
+
+
+class CsvWriter():
+    """Writes result columns to a CSV file, one chunk at a time."""
+    def __init__(self, path, fields):
+        self.file = open(path, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(fields)
+        self.fields = fields
+
+    def write(self, columns):
+        self.writer.writerows(zip(*[columns[name] for name in self.fields]))
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter():
+    """Writes result columns to a Parquet file, one row group per chunk."""
+    def __init__(self, path, fields):
+        import pyarrow
+        import pyarrow.parquet
+
+        self.pyarrow = pyarrow
+        self.fields = fields
+        self.path = path
+        self.writer = None
+
+    def write(self, columns):
+        table = self.pyarrow.table(dict((name, columns[name]) for name in self.fields))
+        if self.writer is None:
+            self.writer = self.pyarrow.parquet.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def process(rows, cache=None):
+    """Results of one chunk of pay records, as columns (employee_id when present, then batch.OUTPUTS).
+    cache = optional cache.WithholdingCache used instead of batch.calculate_batch
+    """
+    calculate = cache.calculate_batch if cache is not None else batch.calculate_batch
+    results = calculate(**to_columns(rows))
+    if any('employee_id' in row for row in rows):
+        results['employee_id'] = [row.get('employee_id') for row in rows]
+    return results
+
+
+def run(input_path, output_path, chunk_size=DEFAULT_CHUNK_SIZE, workers=1, cache=None):
+    """Streams input_path through the calculators into output_path.
+    Only one chunk (two per worker when workers > 1, see runner.map_chunks) is held in memory at a time.
+    cache = cache.WithholdingCache for repeated pay profiles, only used when workers == 1
+    Returns (rows, seconds).
+    """
+    start = time.perf_counter()
+    writer = None
+    count = 0
+    chunks = read_chunks(input_path, chunk_size)
+    if workers == 1:
+        results_by_chunk = (process(rows, cache) for rows in chunks)
+    else:
+        import runner
+        results_by_chunk = runner.map_chunks(chunks, workers)
+    try:
+        for results in results_by_chunk:
+            if writer is None:
+                fields = [name for name in ('employee_id',) if name in results] + list(batch.OUTPUTS)
+                writer = (ParquetWriter if _is_parquet(output_path) else CsvWriter)(output_path, fields)
+            writer.write(results)
+            count += len(results['net_pay'])
+        if writer is None:
+            writer = (ParquetWriter if _is_parquet(output_path) else CsvWriter)(output_path, list(batch.OUTPUTS))
+    finally:
+        if writer is not None:
+            writer.close()
+    return count, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Calculate source deductions for a file of pay records.')
+    parser.add_argument('input', help='CSV or .parquet file of pay records')
+    parser.add_argument('output', help='CSV or .parquet file for the results')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='rows held in memory at once')
+    parser.add_argument('--workers', type=int, default=1, help='worker processes, 0 for one per core')
+    parser.add_argument('--cache', type=int, default=0, help='pay profiles kept in a cache (single worker only)')
+    parser.add_argument('--timings', action='store_true', help='report the time spent in each stage')
+    parser.add_argument('--profile', default=None, help='write cProfile statistics to this file')
+    args = parser.parse_args(argv)
+
+    profiles = None
+    if args.cache:
+        import cache
+        profiles = cache.WithholdingCache(args.cache)
+    with contextlib.ExitStack() as stack:
+        if args.timings or args.profile:
+            import instrument
+            if args.timings:
+                timings = stack.enter_context(instrument.timed())
+            if args.profile:
+                stack.enter_context(instrument.profile(args.profile))
+        count, seconds = run(args.input, args.output, args.chunk_size, args.workers, profiles)
+    if args.timings:
+        print(timings.report(), file=sys.stderr)
+    print('%d rows in %.2f s (%.0f rows/s)' % (count, seconds, count / seconds if seconds else 0), file=sys.stderr)
+    if profiles is not None:
+        print('cache: %(hits)d hits, %(misses)d misses, %(size)d profiles' % profiles.stats(), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    # through the imported module, so instrument times the same functions that run uses
+    import pipeline
+    pipeline.main()
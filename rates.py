@@ -0,0 +1,116 @@
+import datetime
+import os
+
+import constant
+import snapshot
+import tables
+
+
+class Parameters():
+    """Rates and maximums in effect from one date (one file in the rates directory).
+    effective = date the parameters apply from
+    values = dict read from the file, every key becomes an attribute (qpp_rate, ei_max, ...)
+    quebec = TaxTable for T and K of IncomeTaxYear
+    federal = TaxTable for R and K of BasicFederalTax
+    """
+    def __init__(self, effective, values):
+        self.effective = effective
+        self.year = effective.year
+        self.values = values
+        for key, value in values.items():
+            setattr(self, key, value)
+        self.quebec = tables.TaxTable(_brackets(values['quebec_brackets']))
+        self.federal = tables.TaxTable(_brackets(values['federal_brackets']))
+
+
+def _brackets(rows):
+    # [min, max, taux, constante] -> format de constant.py
+    return [{'min': row[0], 'max': row[1], 'income_tax_rate': row[2], 'constant_k': row[3]} for row in rows]
+
+
+def to_date(pay_date):
+    """Accepts a date, a datetime, an ISO string 'YYYY-MM-DD', a year or None (constant.DEFAULT_YEAR)."""
+    if pay_date is None:
+        return datetime.date(constant.DEFAULT_YEAR, 1, 1)
+    if isinstance(pay_date, datetime.datetime):
+        return pay_date.date()
+    if isinstance(pay_date, datetime.date):
+        return pay_date
+    if isinstance(pay_date, int):
+        return datetime.date(pay_date, 1, 1)
+    return datetime.date.fromisoformat(pay_date)
+
+
+class Registry():
+    """Parameter sets by effective date, read from the files YYYY-MM-DD.json of a directory.
+    Files are only read the first time a pay date needs them and are then kept in memory.
+    A file dated later in a year (ex. the July revision of T4127) only needs the keys that change,
+    the other values come from the previous file of the same year.
+    use_snapshot = read the binary image of the directory (see snapshot.py) instead of the JSON files when it is up to date
+    """
+    def __init__(self, directory=constant.RATES_DIRECTORY, use_snapshot=True):
+        self.directory = directory
+        self.use_snapshot = use_snapshot
+        self._dates = None
+        self._cache = {}
+        self._last = None
+        self._snapshot = None
+
+    def effective_dates(self):
+        if self._dates is None:
+            dates = []
+            for name in os.listdir(self.directory):
+                if name.endswith('.json'):
+                    dates.append(datetime.date.fromisoformat(name[:-len('.json')]))
+            self._dates = sorted(dates)
+        return self._dates
+
+    def get(self, pay_date=None):
+        """Parameters in effect on pay_date."""
+        last = self._last
+        if last is not None and last[0] == pay_date:
+            return last[1]
+        day = to_date(pay_date)
+        effective = None
+        for date in self.effective_dates():
+            if date > day:
+                break
+            if date.year == day.year:
+                effective = date
+        if effective is None:
+            raise LookupError('no rates for pay date %s in %s' % (day, self.directory))
+        parameters = self._load(effective)
+        self._last = (pay_date, parameters)
+        return parameters
+
+    def _load(self, effective):
+        if effective not in self._cache and self.use_snapshot:
+            if self._snapshot is None:
+                names = ['%s.json' % date.isoformat() for date in self.effective_dates()]
+                self._snapshot = snapshot.load(os.path.join(self.directory, snapshot.NAME), self.directory, names) or {}
+            if effective in self._snapshot:
+                self._cache[effective] = Parameters(effective, self._snapshot[effective])
+        if effective not in self._cache:
+            import json # seulement sans image binaire a jour
+            values = {}
+            for date in self.effective_dates():
+                if date.year == effective.year and date < effective:
+                    values.update(self._load(date).values)
+            with open(os.path.join(self.directory, '%s.json' % effective.isoformat())) as f:
+                values.update(json.load(f))
+            self._cache[effective] = Parameters(effective, values)
+        return self._cache[effective]
+
+    def clear(self):
+        self._dates = None
+        self._cache = {}
+        self._last = None
+        self._snapshot = None
+
+
+registry = Registry()
+
+
+def get(pay_date=None):
+    """Parameters in effect on pay_date, see Registry.get."""
+    return registry.get(pay_date)
@@ -0,0 +1,55 @@
+import collections
+import concurrent.futures
+import os
+
+import batch
+import pipeline
+
+
+# Repartition d'une paie sur plusieurs processus. Each chunk of employees is independent, so chunks are
+# calculated in a process pool and the results are given back in the order of the chunks. The chunks do
+# not depend on the number of workers, so the output is the same for any number of workers.
+
+
+def chunked(records, chunk_size=pipeline.DEFAULT_CHUNK_SIZE):
+    """Splits an iterable of pay records into lists of chunk_size records."""
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def map_chunks(chunks, workers=None, function=pipeline.process):
+    """Applies function to every chunk in a pool of worker processes and yields the results in order.
+    At most two chunks per worker are in flight, so chunks can be read lazily from a file.
+    workers = number of processes, defaults to os.cpu_count()
+    """
+    workers = workers or os.cpu_count() or 1
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = collections.deque()
+        for chunk in chunks:
+            pending.append(executor.submit(function, chunk))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def run(records, workers=None, chunk_size=pipeline.DEFAULT_CHUNK_SIZE):
+    """Results for a list of pay records (see pipeline.to_columns) calculated over a process pool.
+    Returns a dict of lists keyed by batch.OUTPUTS (and employee_id when present), in the order of records.
+    """
+    results = None
+    for part in map_chunks(chunked(records, chunk_size), workers):
+        if results is None:
+            results = part
+        else:
+            for name, values in part.items():
+                results[name].extend(values)
+    if results is None:
+        results = dict((name, []) for name in batch.OUTPUTS)
+    return results
@@ -0,0 +1,241 @@
+import argparse
+import asyncio
+import collections
+import json
+import logging
+import time
+
+import batch
+import pipeline
+
+
+# Service HTTP/JSON local pour les apercus de talons de paie. Requests for one employee that arrive
+# within a short window are calculated together with batch.calculate_batch, so each one does not pay
+# for building the calculators. Connections are kept alive and /batch streams its results.
+#
+#   POST /withholding   {"remuneration": 1464.56, "pay_periods": 52, "remaining_periods": 50, "E": 15532}
+#   POST /batch         [{...}, {...}]  -> one JSON line per employee, chunked
+#   GET  /stats         queue depth, batches and latency
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WINDOW = 0.002 # secondes
+DEFAULT_MAX_BATCH = 256
+STREAM_CHUNK = 1000
+
+
+class Batcher():
+    """Collects single-employee requests and calculates them in micro-batches.
+    window = seconds to wait for more requests after the first one of a batch
+    max_batch = most requests calculated together
+    """
+    def __init__(self, window=DEFAULT_WINDOW, max_batch=DEFAULT_MAX_BATCH):
+        self.window = window
+        self.max_batch = max_batch
+        self.queue = asyncio.Queue()
+        self.batches = 0
+        self.requests = 0
+        self.latencies = collections.deque(maxlen=10000)
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.ensure_future(self._run())
+
+    async def calculate(self, record):
+        """Deductions of one pay record (see pipeline.to_columns), as a dict keyed by batch.OUTPUTS."""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((record, future, time.perf_counter()))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self.queue.get()]
+            deadline = loop.time() + self.window
+            while len(items) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    items.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            self._calculate(items)
+
+    def _calculate(self, items):
+        try:
+            results = batch.calculate_batch(**pipeline.to_columns([record for record, future, start in items]))
+        except Exception:
+            # une requete invalide ne doit pas faire echouer les autres du lot
+            for item in items:
+                self._calculate_one(item)
+            return
+        self.batches += 1
+        now = time.perf_counter()
+        for i, (record, future, start) in enumerate(items):
+            if not future.done():
+                future.set_result(dict((name, results[name][i]) for name in batch.OUTPUTS))
+            self.requests += 1
+            self.latencies.append(now - start)
+
+    def _calculate_one(self, item):
+        record, future, start = item
+        try:
+            results = batch.calculate_batch(**pipeline.to_columns([record]))
+        except Exception as error:
+            if not future.done():
+                future.set_exception(ValueError(str(error)))
+            return
+        self.batches += 1
+        self.requests += 1
+        self.latencies.append(time.perf_counter() - start)
+        if not future.done():
+            future.set_result(dict((name, results[name][0]) for name in batch.OUTPUTS))
+
+    def stats(self):
+        latencies = sorted(self.latencies)
+
+        def percentile(fraction):
+            if not latencies:
+                return 0
+            return 1000 * latencies[min(len(latencies) - 1, int(fraction * len(latencies)))]
+        return {'queue_depth': self.queue.qsize(), 'batches': self.batches, 'requests': self.requests,
+                'mean_batch': self.requests / self.batches if self.batches else 0,
+                'latency_ms': {'p50': percentile(0.5), 'p95': percentile(0.95), 'p99': percentile(0.99)}}
+
+
+class Service():
+    """HTTP/1.1 server around a Batcher."""
+    def __init__(self, window=DEFAULT_WINDOW, max_batch=DEFAULT_MAX_BATCH):
+        self.batcher = Batcher(window, max_batch)
+
+    async def start(self, host='127.0.0.1', port=8080):
+        self.batcher.start()
+        return await asyncio.start_server(self.handle, host, port)
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                except ValueError as error:
+                    await _respond(writer, 400, {'error': str(error)}, False)
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                await self.route(writer, method, path, body, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, writer, method, path, body, keep_alive):
+        try:
+            if method == 'POST' and path == '/withholding':
+                result = await self.batcher.calculate(json.loads(body))
+                await _respond(writer, 200, result, keep_alive)
+            elif method == 'POST' and path == '/batch':
+                await self.stream(writer, json.loads(body), keep_alive)
+            elif method == 'GET' and path == '/stats':
+                await _respond(writer, 200, self.batcher.stats(), keep_alive)
+            else:
+                await _respond(writer, 404, {'error': 'not found'}, keep_alive)
+        except (ValueError, TypeError, LookupError) as error:
+            await _respond(writer, 400, {'error': str(error)}, keep_alive)
+
+    async def stream(self, writer, records, keep_alive):
+        """Results of a list of records, one JSON line each, sent STREAM_CHUNK records at a time.
+        Every record is checked before the head is sent; an error found later (a pay date without rates...)
+        ends the stream with a {"error": ...} line.
+        """
+        if not isinstance(records, list) or not all(isinstance(record, dict) for record in records):
+            raise ValueError('a list of pay records is expected')
+        if records:
+            pipeline.to_columns(records)
+        writer.write(_head(200, 'application/x-ndjson', keep_alive, chunked=True))
+        for start in range(0, len(records), STREAM_CHUNK):
+            try:
+                results = pipeline.process(records[start:start + STREAM_CHUNK])
+            except (ValueError, TypeError, LookupError, ZeroDivisionError) as error:
+                _write_chunk(writer, (json.dumps({'error': str(error), 'record': start}) + '\n').encode())
+                break
+            lines = ''.join(json.dumps(dict((name, values[i]) for name, values in results.items())) + '\n'
+                            for i in range(len(results['net_pay']))).encode()
+            _write_chunk(writer, lines)
+            await writer.drain()
+        writer.write(b'0\r\n\r\n')
+        await writer.drain()
+
+
+def _write_chunk(writer, data):
+    writer.write(b'%x\r\n%s\r\n' % (len(data), data))
+
+
+async def _read_request(reader):
+    """(method, path, headers, body), None at the end of the connection; ValueError for a malformed request."""
+    line = await reader.readline()
+    if not line:
+        return None
+    parts = line.decode('latin-1').split(' ', 2)
+    if len(parts) != 3:
+        raise ValueError('malformed request line')
+    method, path, _ = parts
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get('content-length', 0))
+    except ValueError:
+        raise ValueError('invalid Content-Length')
+    body = await reader.readexactly(length)
+    return method, path, headers, body
+
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found'}
+
+
+def _head(status, content_type, keep_alive, length=None, chunked=False):
+    lines = ['HTTP/1.1 %d %s' % (status, REASONS[status]), 'Content-Type: %s' % content_type,
+             'Connection: %s' % ('keep-alive' if keep_alive else 'close')]
+    if chunked:
+        lines.append('Transfer-Encoding: chunked')
+    else:
+        lines.append('Content-Length: %d' % length)
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+
+async def _respond(writer, status, data, keep_alive):
+    body = json.dumps(data).encode()
+    writer.write(_head(status, 'application/json', keep_alive, len(body)) + body)
+    await writer.drain()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Local HTTP/JSON pay calculation service.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--window-ms', type=float, default=DEFAULT_WINDOW * 1000, help='micro-batch window')
+    parser.add_argument('--max-batch', type=int, default=DEFAULT_MAX_BATCH, help='largest micro-batch')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    async def serve():
+        service = Service(args.window_ms / 1000, args.max_batch)
+        server = await service.start(args.host, args.port)
+        logger.info('listening on %s:%d', args.host, args.port)
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(serve())
+
+
+if __name__ == '__main__':
+    main()
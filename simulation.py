@@ -0,0 +1,204 @@
+import argparse
+import datetime
+import itertools
+import operator
+
+import batch
+import rates
+
+
+# Projection du reste de l'annee. Every remaining pay period of many employees under many scenarios (a raise,
+# an RRSP contribution, union dues, Fondaction shares) is calculated with batch.calculate_batch, one call per
+# period for every (scenario, employee) still paid, and the QPP, QPIP and EI paid so far are carried from one
+# period to the next so the maximums stop the contributions when they are reached. The amounts paid so far
+# only change the results through the QPP, QPIP and EI of the period: without line 19, a row whose three
+# contributions and parameters are the same as at its last calculation takes those results again.
+#
+#   python simulation.py paies.csv --scenario hausse:raise_rate=0.03 --scenario reer:F=100,U1=15
+
+TOTALS = ('gross', 'income_tax_withheld_period', 'quebec_pension_plan', 'quebec_parental_insurance_plan',
+          'employement_insurance', 'federal_tax_per_period', 'net_pay', 'take_home')
+
+
+class Scenario():
+    """Changes applied to every remaining pay period of every employee.
+    raise_rate = raise as a fraction of the remuneration (0.03 for 3 %)
+    raise_amount = raise per pay period, added after raise_rate
+    F = RRSP contribution withheld per pay period, U1 = union dues per pay period
+    Q1 = Fondaction shares purchased per pay period (see objects.IncomeTaxYear)
+    F, U1 and Q1 are added to the amounts the employee already has.
+    """
+    __slots__ = ('name', 'raise_rate', 'raise_amount', 'F', 'U1', 'Q1')
+
+    def __init__(self, name, raise_rate=0, raise_amount=0, F=0, U1=0, Q1=0):
+        self.name = name
+        self.raise_rate = raise_rate
+        self.raise_amount = raise_amount
+        self.F = F
+        self.U1 = U1
+        self.Q1 = Q1
+
+    def __repr__(self):
+        return 'Scenario(%r)' % self.name
+
+
+def period_date(pay_date, pay_periods, k):
+    """Date of the pay k periods after pay_date, kept in the year of pay_date."""
+    day = rates.to_date(pay_date)
+    later = day + datetime.timedelta(days=365 * k // pay_periods)
+    return min(later, datetime.date(day.year, 12, 31))
+
+
+def project(scenarios, remuneration, pay_periods, remaining_periods, E, K1=0, Q=0, Q1=0, A5=0, A6=0, ei_paid=0,
+            line_19=0, TC=0, pay_date=None, F=0, U1=0):
+    """Totals of the remaining pay periods of the year for every employee under every scenario.
+
+    scenarios = list of Scenario
+    The other arguments are the columns of batch.calculate_batch for the next pay period: remaining_periods
+    is the number of pays left including that one, A5, A6 and ei_paid what was paid before it.
+    pay_date = date of the next pay, the following ones are P per year after it (see period_date)
+
+    Returns {scenario name: {total: list with one value per employee}} for the names in TOTALS, where
+    take_home = net_pay less F, U1, Q and Q1 withheld.
+    """
+    size = batch._size(remuneration, pay_periods, remaining_periods, E, K1, Q, Q1, A5, A6, ei_paid, line_19, TC, pay_date, F, U1)
+
+    def expand(value):
+        return list(itertools.islice(batch._column(value), size))
+
+    employees = dict((name, expand(value)) for name, value in (
+        ('remuneration', remuneration), ('pay_periods', pay_periods), ('remaining_periods', remaining_periods), ('E', E),
+        ('K1', K1), ('Q', Q), ('Q1', Q1), ('line_19', line_19), ('TC', TC), ('pay_date', pay_date), ('F', F), ('U1', U1)))
+
+    # une ligne par (scenario, employe), les scenarios les uns apres les autres
+    rows = dict((name, values * len(scenarios)) for name, values in employees.items())
+    rows['remuneration'] = [rem * (1 + scenario.raise_rate) + scenario.raise_amount
+                            for scenario in scenarios for rem in employees['remuneration']]
+    for name in ('F', 'U1', 'Q1'):
+        rows[name] = [value + getattr(scenario, name) for scenario in scenarios for value in employees[name]]
+    count = len(rows['remuneration'])
+    if pay_date is None:
+        days = [None] * count
+    else:
+        days = [rates.to_date(day) for day in rows['pay_date']]
+    dates = {}
+
+    # par ligne: QPP, QPIP et AE payes depuis le debut de l'annee, puis les TOTALS du reste de l'annee
+    accumulated = [[a5, a6, ei] + [0] * len(TOTALS) for a5, a6, ei in zip(expand(A5) * len(scenarios), expand(A6) * len(scenarios),
+                                                                       expand(ei_paid) * len(scenarios))]
+    withheld = [f + u1 + q + q1 for f, u1, q, q1 in zip(rows['F'], rows['U1'], rows['Q'], rows['Q1'])]
+
+    # ce que la derniere periode calculee de chaque ligne ajoute a accumulated et les parametres qui l'ont donnee
+    contributions = ('quebec_pension_plan', 'quebec_parental_insurance_plan', 'employement_insurance')
+    outputs = contributions + TOTALS[1:-1]
+    last = [None] * count
+    last_parameters = [None] * count
+    parameters_on = {}
+    remuneration, pay_periods, remaining, line_19 = rows['remuneration'], rows['pay_periods'], rows['remaining_periods'], rows['line_19']
+    add = operator.add
+
+    active = list(range(count))
+    k = 0
+    while True:
+        active = [i for i in active if remaining[i] > k]
+        if not active:
+            break
+        fresh = []
+        fresh_days = []
+        for i in active:
+            day = _period_date(dates, days[i], pay_periods[i], k)
+            if day not in parameters_on:
+                parameters_on[day] = rates.get(day)
+            parameters = parameters_on[day]
+            if (line_19[i] or last_parameters[i] is not parameters
+                    or _contributions(parameters, remuneration[i], pay_periods[i], accumulated[i]) != last[i][:3]):
+                fresh.append(i)
+                fresh_days.append(day)
+            last_parameters[i] = parameters
+
+        if fresh:
+            columns = dict((name, [rows[name][i] for i in fresh])
+                           for name in ('remuneration', 'pay_periods', 'E', 'K1', 'Q', 'Q1', 'line_19', 'TC', 'F', 'U1'))
+            columns['remaining_periods'] = [remaining[i] - k for i in fresh]
+            for n, name in enumerate(('A5', 'A6', 'ei_paid')):
+                columns[name] = [accumulated[i][n] for i in fresh]
+            results = batch.calculate_batch(pay_date=fresh_days, **columns)
+            for i, values in zip(fresh, zip(*[results[name] for name in outputs])):
+                last[i] = values[:3] + (remuneration[i],) + values[3:] + (values[-1] - withheld[i],)
+
+        for i in active:
+            accumulated[i] = list(map(add, accumulated[i], last[i]))
+        k += 1
+
+    projection = {}
+    for n, scenario in enumerate(scenarios):
+        part = accumulated[n * size:(n + 1) * size]
+        projection[scenario.name] = dict((name, [values[3 + t] for values in part]) for t, name in enumerate(TOTALS))
+    return projection
+
+
+def _contributions(parameters, remuneration, pay_periods, paid):
+    # QPP, QPIP et AE de la periode, memes calculs que batch.calculate_batch
+    qpp = parameters.qpp_rate * (remuneration - (parameters.qpp_exemption / pay_periods))
+    M, A5 = parameters.qpp_max, paid[0]
+    if A5 >= M:
+        A5 = M
+    if qpp > M - A5:
+        qpp = M - A5
+    qpip = parameters.qpip_rate * remuneration
+    N, A6 = parameters.qpip_max, paid[1]
+    if A6 >= N:
+        A6 = N
+    if qpip > N - A6:
+        qpip = N - A6
+    ei = remuneration * parameters.ei_rate
+    year_max, ei_paid = parameters.ei_max, paid[2]
+    if year_max <= ei_paid:
+        year_max = ei_paid
+    if ei > year_max - ei_paid:
+        ei = year_max - ei_paid
+    return qpp, qpip, ei
+
+
+def _period_date(dates, day, pay_periods, k):
+    # period_date garde en memoire, les employes d'une meme frequence de paie partagent leurs dates
+    if day is None or k == 0:
+        return day
+    key = (day, pay_periods, k)
+    if key not in dates:
+        dates[key] = period_date(day, pay_periods, k)
+    return dates[key]
+
+
+def parse_scenario(text):
+    """'name:field=value,...' -> Scenario, the fields being the arguments of Scenario."""
+    name, _, fields = text.partition(':')
+    values = {}
+    for field in filter(None, fields.split(',')):
+        key, _, value = field.partition('=')
+        if key not in Scenario.__slots__[1:]:
+            raise ValueError('unknown scenario field %s' % key)
+        values[key] = float(value)
+    return Scenario(name, **values)
+
+
+def main(argv=None):
+    import pipeline
+
+    parser = argparse.ArgumentParser(description='Project the rest of the year for a file of pay records.')
+    parser.add_argument('input', help='CSV or .parquet file of pay records for the next pay period (see pipeline.py)')
+    parser.add_argument('--scenario', action='append', type=parse_scenario, default=[],
+                        help='name:field=value,... with the fields raise_rate, raise_amount, F, U1, Q1')
+    args = parser.parse_args(argv)
+
+    rows = [row for chunk in pipeline.read_chunks(args.input) for row in chunk]
+    scenarios = [Scenario('actuel')] + args.scenario
+    projection = project(scenarios, **pipeline.to_columns(rows))
+    print('%-20s' % 'scenario' + ''.join('%16s' % name[:15] for name in TOTALS))
+    for scenario in scenarios:
+        totals = projection[scenario.name]
+        print('%-20s' % scenario.name + ''.join('%16.2f' % sum(totals[name]) for name in TOTALS))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+import datetime
+import os
+import struct
+import sys
+import zlib
+
+import constant
+
+
+# Image binaire des parametres. Every parameter set of the rates directory, with the values inherited
+# from the earlier files of its year already merged, written as binary numbers in one file that is read in one
+# call: no json to import or parse when a short-lived process needs its first result. The image keeps a
+# CRC of the names and contents of the JSON files it was built from and is ignored as soon as one of them
+# changes. The contents are read as bytes without parsing them, so the check does not depend on the
+# modification times (a fresh clone or a checkout keeps the image).
+#
+#   python snapshot.py              rebuilds rates/parameters.bin
+
+NAME = 'parameters.bin'
+PATH = os.path.join(constant.RATES_DIRECTORY, NAME)
+MAGIC = b'PQRP'
+VERSION = 3
+# magic, version, parameter sets, CRC of the JSON files
+HEADER = struct.Struct('<4sHHI')
+# effective date (ordinal), Quebec brackets, federal brackets, size of the key names (separated by a new
+# line), size of the struct format of the values; then the names, the format and the values
+SET = struct.Struct('<iHHHH')
+BRACKETS = ('quebec_brackets', 'federal_brackets')
+
+
+def sources_crc(directory, names=None):
+    """CRC32 of the names and contents of the JSON files of directory.
+    names = the JSON file names of directory when the caller already listed it
+    """
+    if names is None:
+        names = [name for name in os.listdir(directory) if name.endswith('.json')]
+    crc = 0
+    for name in sorted(names):
+        crc = zlib.crc32(name.encode(), crc)
+        fd = os.open(os.path.join(directory, name), os.O_RDONLY)
+        try:
+            crc = zlib.crc32(os.read(fd, os.fstat(fd).st_size), crc)
+        finally:
+            os.close(fd)
+    return crc
+
+
+def build(registry, path=None):
+    """Writes the parameter sets of a rates.Registry to path (NAME in its directory by default)."""
+    path = path or os.path.join(registry.directory, NAME)
+    sets = [registry._load(effective) for effective in registry.effective_dates()]
+    parts = [HEADER.pack(MAGIC, VERSION, len(sets), sources_crc(registry.directory))]
+    for parameters in sets:
+        values = parameters.values
+        quebec, federal = values['quebec_brackets'], values['federal_brackets']
+        keys = sorted(key for key in values if key not in BRACKETS)
+        numbers = [values[key] for key in keys] + [cell for row in quebec + federal for cell in row]
+        names = '\n'.join(keys).encode()
+        # q pour les entiers des fichiers JSON (3500, 44545...), qui restent des int
+        layout = ('<' + ''.join('q' if isinstance(number, int) else 'd' for number in numbers)).encode()
+        parts.append(SET.pack(parameters.effective.toordinal(), len(quebec), len(federal), len(names), len(layout)))
+        parts.append(names + layout + struct.pack(layout.decode(), *numbers))
+    with open(path, 'wb') as f:
+        f.write(b''.join(parts))
+    return path
+
+
+def load(path, directory=None, names=None):
+    """{effective date: values} read from the image at path, None when there is no image, it is not
+    a parameter image of this VERSION or it is older than the JSON files of directory.
+    names = see sources_crc
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
+        return None
+    try:
+        data = os.read(fd, os.fstat(fd).st_size)
+    finally:
+        os.close(fd)
+    if len(data) < HEADER.size:
+        return None
+    magic, version, count, crc = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        return None
+    if directory is not None and crc != sources_crc(directory, names):
+        return None
+    offset = HEADER.size
+    sets = {}
+    for _ in range(count):
+        ordinal, quebec, federal, names, layout = SET.unpack_from(data, offset)
+        offset += SET.size
+        keys = data[offset:offset + names].decode().split('\n')
+        offset += names
+        layout = data[offset:offset + layout].decode()
+        offset += len(layout)
+        numbers = struct.unpack_from(layout, data, offset)
+        offset += struct.calcsize(layout)
+        values = dict(zip(keys, numbers))
+        cells = numbers[len(keys):]
+        rows = [list(cells[i:i + 4]) for i in range(0, len(cells), 4)]
+        values['quebec_brackets'] = rows[:quebec]
+        values['federal_brackets'] = rows[quebec:]
+        sets[datetime.date.fromordinal(ordinal)] = values
+    return sets
+
+
+def main(argv=None):
+    import rates
+    path = build(rates.Registry(use_snapshot=False), argv[0] if argv else None)
+    print('wrote %s' % path)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,33 @@
+import bisect
+
+
+class TaxTable():
+    """Tax brackets compiled into sorted lists so a bracket is found by bisection.
+    brackets = list of {'min', 'max', 'income_tax_rate', 'constant_k'} (see rates.Parameters)
+    An income I is in a bracket when min < I <= max. Incomes under the first bracket use the
+    first bracket and incomes over the last one use the last bracket.
+    """
+    def __init__(self, brackets):
+        brackets = sorted(brackets, key=lambda element: element['max'])
+        self.thresholds = [element['max'] for element in brackets]
+        self.rates = [element['income_tax_rate'] for element in brackets]
+        self.constants = [element['constant_k'] for element in brackets]
+        self.last = len(brackets) - 1
+
+    def index(self, income):
+        i = bisect.bisect_left(self.thresholds, income)
+        if i > self.last:
+            i = self.last
+        return i
+
+    def lookup(self, income):
+        # retourne (taux, constante)
+        i = self.index(income)
+        return self.rates[i], self.constants[i]
+
+    def lookup_many(self, incomes):
+        """Rates and constants for a column of incomes, returned as two lists."""
+        thresholds, rates, constants, last = self.thresholds, self.rates, self.constants, self.last
+        search = bisect.bisect_left
+        found = [min(search(thresholds, income), last) for income in incomes]
+        return [rates[i] for i in found], [constants[i] for i in found]
@@ -0,0 +1,25 @@
+import os
+import random
+import sys
+
+import pytest
+
+# les modules sont a la racine du depot
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def columns():
+    """Columns of batch.calculate_batch for 500 random employees, caps and line 19 included."""
+    rnd = random.Random(1)
+    rows = []
+    for _ in range(500):
+        P = rnd.choice((52, 26, 24, 12))
+        rows.append({'remuneration': round(rnd.uniform(300, 8000) * 52 / P, 2), 'pay_periods': P,
+                     'remaining_periods': rnd.randint(1, P), 'E': rnd.choice((15532, 0, 20000)), 'K1': rnd.choice((0, 100)),
+                     'Q': rnd.choice((0, 10)), 'Q1': rnd.choice((0, 5)), 'A5': rnd.choice((0, 1000, 3146.4, 3200)),
+                     'A6': rnd.choice((0, 380, 387.79)), 'ei_paid': rnd.choice((0, 600, 650.4)),
+                     'line_19': rnd.choice((0, 500)), 'TC': rnd.choice((0, 13229)),
+                     'pay_date': rnd.choice(('2020-01-03', '2020-07-10')), 'F': rnd.choice((0, 0, 50.25)),
+                     'U1': rnd.choice((0, 0, 12.5))})
+    return dict((name, [row[name] for row in rows]) for name in rows[0])
@@ -0,0 +1,64 @@
+import pytest
+
+import batch
+import federal
+import graph
+import objects
+import rates
+
+
+def _rows(columns):
+    names = list(columns)
+    return [dict(zip(names, values)) for values in zip(*columns.values())]
+
+
+def test_batch_matches_the_chain_of_classes(columns):
+    results = batch.calculate_batch(**columns)
+    for i, row in enumerate(_rows(columns)):
+        expected = graph.Calculation(**row).get(*batch.OUTPUTS)
+        for name in batch.OUTPUTS:
+            assert results[name][i] == pytest.approx(expected[name], rel=1e-12, abs=1e-9), (i, name)
+
+
+def test_bonus_batch_matches_the_non_periodic_classes(columns):
+    bonus = [500 + 37 * i for i in range(len(columns['remuneration']))]
+    results = batch.calculate_bonus_batch(bonus, **columns)
+    for i, row in enumerate(_rows(columns)):
+        P, pay_date = row['pay_periods'], row['pay_date']
+        regular = graph.Calculation(**row).get('annual_income', 'annual_taxable_income', 'quebec_pension_plan',
+                                               'employement_insurance')
+        quebec = objects.IncomeTaxOnNonPeriodicPayment(regular['annual_income'], bonus[i], row['K1'], row['E'], P,
+                                                       row['Q'], row['Q1'], pay_date).calculate()
+        federal_tax = federal.FederalTaxOnNonPeriodicPayment(regular['annual_taxable_income'], bonus[i], P=P,
+                                                             C=regular['quebec_pension_plan'],
+                                                             AE=regular['employement_insurance'],
+                                                             IE=row['remuneration'], TC=row['TC'],
+                                                             pay_date=pay_date).calculate()
+        assert results['income_tax_on_payment'][i] == pytest.approx(quebec, abs=1e-6)
+        assert results['federal_tax_on_payment'][i] == pytest.approx(federal_tax, abs=1e-6)
+        assert results['income_tax_on_payment'][i] >= 0
+        # la paie reguliere passe avant le paiement
+        M = rates.get(pay_date).qpp_max
+        assert regular['quebec_pension_plan'] + results['quebec_pension_plan'][i] <= M - min(row['A5'], M) + 1e-9
+
+
+def test_quebec_tax_grows_with_income():
+    # derniere tranche du Quebec: l'impot ne baisse pas au-dessus de 108 390 $
+    taxes = [objects.IncomeTaxYear(I=income, E=15532, P=52, pay_date='2020-01-03').calculate()
+             for income in range(100000, 140000, 1000)]
+    assert taxes == sorted(taxes)
+    assert batch.calculate_bonus_batch([3000], [2080], 52, 52, 15532)['income_tax_on_payment'][0] > 0
+
+
+def test_numpy_path_gives_the_loop_results(columns, monkeypatch):
+    numpy = pytest.importorskip('numpy')
+    monkeypatch.setattr(batch, 'NUMPY_CHUNK', 128)
+    size = len(columns['remuneration'])
+    names = ('remuneration', 'pay_periods', 'remaining_periods', 'E', 'K1', 'Q', 'Q1', 'A5', 'A6', 'ei_paid',
+             'line_19', 'TC', 'pay_date', 'F', 'U1')
+    arguments = [columns[name] for name in names]
+    assert batch._calculate_numpy(numpy, size, *arguments) == batch._calculate_loop(size, *arguments)
+    # colonnes numpy et valeurs communes a tous les employes
+    arguments[0] = numpy.array(columns['remuneration'])
+    arguments[12] = '2020-07-10'
+    assert batch._calculate_numpy(numpy, size, *arguments) == batch._calculate_loop(size, *arguments)
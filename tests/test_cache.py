@@ -0,0 +1,51 @@
+import gc
+import inspect
+import tracemalloc
+
+import pytest
+
+import batch
+import cache
+
+
+def test_cache_matches_batch(columns):
+    expected = batch.calculate_batch(**columns)
+    withholding = cache.WithholdingCache()
+    for _ in range(2):
+        results = withholding.calculate_batch(**columns)
+        for name in batch.OUTPUTS:
+            assert results[name] == pytest.approx(expected[name], rel=1e-12, abs=1e-9), name
+    assert withholding.hits >= len(columns['remuneration'])
+
+
+def test_cache_keeps_maxsize(columns):
+    withholding = cache.WithholdingCache(maxsize=10)
+    withholding.calculate_batch(**columns)
+    assert len(withholding) == 10
+
+
+def test_same_signature_as_batch():
+    assert inspect.signature(cache.WithholdingCache.calculate_batch).parameters.keys() - {'self'} == \
+        inspect.signature(batch.calculate_batch).parameters.keys()
+
+
+def test_cache_keeps_max_bytes(columns):
+    withholding = cache.WithholdingCache(max_bytes=100 * cache.ENTRY_BYTES + cache.ENTRY_BYTES // 2)
+    withholding.calculate_batch(**columns)
+    assert withholding.maxsize == 100
+    assert len(withholding) == 100
+
+
+def test_entries_fit_in_entry_bytes():
+    columns = dict(remuneration=[1000 + k / 7 for k in range(2000)], pay_periods=52, remaining_periods=50, E=15532,
+                   pay_date='2020-01-03')
+    withholding = cache.WithholdingCache()
+    withholding.calculate(1000, 52, 50, 15532, pay_date='2020-01-03')
+    tracemalloc.start()
+    try:
+        withholding.calculate_batch(**columns)
+        gc.collect()
+        used = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    assert used <= 2000 * cache.ENTRY_BYTES
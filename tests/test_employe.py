@@ -0,0 +1,47 @@
+import datetime
+
+import pytest
+
+import employe
+
+
+def test_weekly_payment_rejects_a_pay_without_deductions():
+    employee = employe.Employee(52, 1500, 0, 50, employee_id='E1', E=15532)
+    company = employe.Company(0.01, 1.0, 1.4, 1.4, 0.02)
+    calculated = employe.employee_pay('2020-01-10', 1, employee, 40, 1500, company=company)
+    given = employe.employee_pay('2020-01-10', 1, employee, 40, 1500, net_pay=1100, company=company)
+    assert employe.weekly_company_payment([calculated], 10, 0.09975, 0.05)['gross'] == 1500
+    with pytest.raises(ValueError):
+        employe.weekly_company_payment([calculated, given], 10, 0.09975, 0.05)
+
+
+def _company():
+    company = employe.Company(0.01, 1.0, 1.4, 1.4, 0.02)
+    company.hire(employe.Employee(52, 3000, 0, 52, employee_id='E1', E=15532))
+    return company
+
+
+def test_failed_or_repeated_run_keeps_the_year_to_date():
+    company = _company()
+    company.pay_run('2020-01-10', 1)
+    company.pay_run('2020-01-17', 2)
+    paid = (company.employees.A5[0], company.employees.remaining_periods[0], company.year)
+    with pytest.raises(LookupError):
+        company.pay_run('2021-01-08', 3)
+    with pytest.raises(ValueError):
+        company.pay_run('2020-01-17', 3)
+    assert (company.employees.A5[0], company.employees.remaining_periods[0], company.year) == paid
+    company.pay_run('2020-01-24', 3)
+    assert company.employees.A5[0] == pytest.approx(3 * paid[0] / 2)
+
+
+def test_year_to_date_stops_at_the_maximum():
+    company = _company()
+    for week in range(52):
+        company.pay_run(datetime.date(2020, 1, 3) + datetime.timedelta(weeks=week), week + 1)
+    assert company.employees.A5[0] == pytest.approx(3146.4)
+
+
+def test_employee_options_are_given_by_name():
+    with pytest.raises(TypeError):
+        employe.Employee(52, 1500, 0, 50, 0.012, 650.4, 0.06, 1245)
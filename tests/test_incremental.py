@@ -0,0 +1,31 @@
+import pytest
+
+import incremental
+
+
+PAY = [1400 + 25 * k for k in range(12)]
+
+
+def _year(pay=PAY, changes=()):
+    """A year of weekly periods, each change (period, name, value) given to add_period."""
+    year = incremental.EmployeeYear(52, E=15532, TC=13229, pay_date='2020-01-03')
+    for k, remuneration in enumerate(pay):
+        inputs = dict((name, value) for period, name, value in changes if period == k)
+        year.add_period(remuneration, retro_pay=300 if k == 4 else 0, **inputs)
+    return year
+
+
+@pytest.mark.parametrize('name, value', [('E', 20000), ('TC', 0), ('Q', 10), ('Q1', 5), ('K1', 100),
+                                         ('line_19', 500), ('authorized_deduction', 1000)])
+def test_set_gives_a_full_recalculation(name, value):
+    year = _year()
+    year.set(3, name, value)
+    assert year.recalculate() == _year(changes=[(3, name, value)]).results
+
+
+def test_remuneration_is_set_for_one_period():
+    year = _year()
+    year.set(3, 'remuneration', 9000)
+    pay = list(PAY)
+    pay[3] = 9000
+    assert year.recalculate() == _year(pay).results
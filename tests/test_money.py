@@ -0,0 +1,71 @@
+import inspect
+
+import batch
+import money
+
+
+AMOUNTS = ('remuneration', 'E', 'K1', 'Q', 'Q1', 'A5', 'A6', 'ei_paid', 'line_19', 'TC', 'F', 'U1')
+
+
+def test_same_signature_as_batch():
+    assert inspect.signature(money.calculate_batch) == inspect.signature(batch.calculate_batch)
+
+
+def test_cents_within_three_cents_of_floats(columns):
+    floats = batch.calculate_batch(**columns)
+    cents = money.calculate_batch(**dict((name, [money.to_cents(value) for value in values] if name in AMOUNTS else values)
+                                         for name, values in columns.items()))
+    for name in ('income_tax_withheld_period', 'quebec_pension_plan', 'quebec_parental_insurance_plan',
+                 'employement_insurance', 'federal_tax_per_period', 'net_pay'):
+        assert all(isinstance(value, int) for value in cents[name])
+        assert max(abs(100 * a - b) for a, b in zip(floats[name], cents[name])) < 3, name
+
+
+def test_one_employee():
+    results = money.calculate(146456, 52, 50, 1553200, outputs=('net_pay', 'quebec_pension_plan'), pay_date='2020-01-03')
+    assert results == {'net_pay': money.calculate_batch([146456], 52, 50, 1553200, pay_date='2020-01-03')['net_pay'][0],
+                       'quebec_pension_plan': 7964}
+
+
+def _chain(rem, P, Pr, E, K1, Q, Q1, A5, A6, ei_paid, line_19, TC, pay_date, F, U1):
+    """The chain of app.py with the cents classes."""
+    deduction = money.DeductionForEmploymentIncome(rem, P, pay_date).calculate()
+    sdr = money.SourceDeductionReturn(P, line_19, Pr).calculate()
+    I = money.AnnualIncome(P, rem, F, deduction, sdr).calculate()
+    Y = money.IncomeTaxYear(I, K1, E, P, Q, Q1, pay_date).calculate()
+    quebec_tax = money.IncomeTaxWithheldPerPeriod(Y, P).calculate()
+    qpp = money.QuebecPensionPlan(S3=rem, P=P, A5=A5, pay_date=pay_date).calculate()
+    qpip = money.QuebecParentalInsurancePlan(S4=rem, A6=A6, pay_date=pay_date).calculate()
+    A = money.AnnualTaxableIncome(P=P, I=rem, F=qpp + F, U1=U1).calculate()
+    ei = money.EmployementInsurance(rem, paid_this_year=ei_paid, pay_date=pay_date).calculate()
+    T3 = money.BasicFederalTax(A=A, TC=TC, P=P, C=qpp, AE=ei, IE=rem, pay_date=pay_date).calculate()
+    T1 = money.AnnualPayableTaxFederal(T3, pay_date=pay_date).calculate()
+    federal_tax = money.FederalTaxRate(T1, P, 0).calculate()
+    return rem - federal_tax - qpip - qpp - quebec_tax - ei
+
+
+def test_cents_classes_give_the_batch(columns):
+    cents = dict((name, [money.to_cents(value) for value in values] if name in AMOUNTS else values)
+                 for name, values in columns.items())
+    results = money.calculate_batch(**cents)
+    names = ('remuneration', 'pay_periods', 'remaining_periods', 'E', 'K1', 'Q', 'Q1', 'A5', 'A6', 'ei_paid',
+             'line_19', 'TC', 'pay_date', 'F', 'U1')
+    for i, row in enumerate(zip(*(cents[name] for name in names))):
+        assert _chain(*row) == results['net_pay'][i], i
+
+
+def test_published_2020_values():
+    # TP-1015.F-V et T4127 (2020): paie hebdomadaire de 1 464,56 $
+    assert money.QuebecPensionPlan(S3=146456, P=52, pay_date='2020-01-03').calculate() == 7964
+    assert money.QuebecParentalInsurancePlan(S4=146456, pay_date='2020-01-03').calculate() == 723
+    assert money.EmployementInsurance(146456, pay_date='2020-01-03').calculate() == 1757
+    # maximums de l'annee: 3 146,40 $, 387,79 $ et 650,40 $
+    assert money.QuebecPensionPlan(S3=10000000, P=52, pay_date='2020-01-03').calculate() == 314640
+    assert money.QuebecParentalInsurancePlan(S4=10000000, pay_date='2020-01-03').calculate() == 38779
+    assert money.EmployementInsurance(10000000, pay_date='2020-01-03').calculate() == 65040
+    # Y = 20 % × 50 000 $ – 2 227 $ – 15 % × 15 532 $
+    assert money.IncomeTaxYear(I=5000000, E=1553200, pay_date='2020-01-03').calculate() == 544320
+    # T3 = 20,5 % × 50 000 $ – 2 669 $ – 15 % × (13 229 $ + 1 245 $), T1 = (T3 – 750 $) – 16,5 % × T3
+    T3 = money.BasicFederalTax(A=5000000, TC=1322900, pay_date='2020-01-03').calculate()
+    assert T3 == 540990
+    assert money.AnnualPayableTaxFederal(T3, pay_date='2020-01-03').calculate() == 376727
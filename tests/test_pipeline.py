@@ -0,0 +1,49 @@
+import csv
+import random
+
+import pytest
+
+import pipeline
+
+
+FIELDS = ('employee_id', 'remuneration', 'pay_periods', 'remaining_periods', 'E', 'A5', 'line_19', 'pay_date')
+
+
+@pytest.fixture
+def records(tmp_path):
+    # colonnes optionnelles vides sur une partie des lignes, la premiere comprise
+    rnd = random.Random(2)
+    path = tmp_path / 'paies.csv'
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(FIELDS)
+        for i in range(250):
+            writer.writerow((i, round(rnd.uniform(300, 4000), 2), 52, rnd.randint(1, 52), 15532,
+                             rnd.choice(('', '', 3146.4, 1000)), rnd.choice(('', 400)), '2020-05-01'))
+    return path
+
+
+def _run(records, tmp_path, chunk_size, workers):
+    output = tmp_path / ('out_%d_%d.csv' % (chunk_size, workers))
+    count, _ = pipeline.run(str(records), str(output), chunk_size=chunk_size, workers=workers)
+    assert count == 250
+    return output.read_text()
+
+
+def test_output_does_not_depend_on_chunk_size_or_workers(records, tmp_path):
+    expected = _run(records, tmp_path, 1000, 1)
+    for chunk_size, workers in ((1, 1), (7, 1), (64, 1), (7, 2)):
+        assert _run(records, tmp_path, chunk_size, workers) == expected, (chunk_size, workers)
+
+
+def test_blank_optional_value_is_the_default():
+    columns = pipeline.to_columns([{'remuneration': '3000', 'pay_periods': '52', 'remaining_periods': '5', 'E': '0', 'A5': ''},
+                                   {'remuneration': '3000', 'pay_periods': '52', 'remaining_periods': '5', 'E': '0', 'A5': '3146.4'}])
+    assert columns['A5'] == [0, 3146.4]
+
+
+def test_rrsp_and_union_dues_are_read():
+    rows = [{'remuneration': '3000', 'pay_periods': '52', 'remaining_periods': '5', 'E': '0', 'F': '100', 'U1': ''}]
+    columns = pipeline.to_columns(rows)
+    assert (columns['F'], columns['U1']) == ([100.0], 0)
+    assert pipeline.process(rows)['net_pay'] != pipeline.process([dict(rows[0], F='')])['net_pay']
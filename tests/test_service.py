@@ -0,0 +1,83 @@
+import asyncio
+import json
+
+import batch
+import service
+
+
+RECORD = {'remuneration': 3000, 'pay_periods': 52, 'remaining_periods': 5, 'E': 15532}
+
+
+async def _request(port, method, path, body=None):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    data = json.dumps(body).encode() if body is not None else b''
+    writer.write(b'%s %s HTTP/1.1\r\nContent-Length: %d\r\nConnection: close\r\n\r\n%s'
+                 % (method.encode(), path.encode(), len(data), data))
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b'\r\n\r\n')
+    return head, body
+
+
+async def _raw(port, data):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(data)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return response
+
+
+def _serve(test):
+    async def main():
+        server = await service.Service(window=0.05).start(port=0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            return await test(port)
+        finally:
+            server.close()
+    return asyncio.run(main())
+
+
+def _dechunk(body):
+    data = b''
+    while True:
+        size, _, body = body.partition(b'\r\n')
+        size = int(size, 16)
+        if size == 0:
+            return data
+        data += body[:size]
+        body = body[size + 2:]
+
+
+def test_mixed_requests_in_one_batch():
+    capped = dict(RECORD, A5=3146.4)
+    alone = batch.calculate_batch(**dict((name, [value]) for name, value in capped.items()))
+
+    async def test(port):
+        return await asyncio.gather(_request(port, 'POST', '/withholding', RECORD),
+                                    _request(port, 'POST', '/withholding', capped))
+    (_, plain), (_, with_a5) = _serve(test)
+    assert json.loads(plain)['quebec_pension_plan'] > 0
+    assert json.loads(with_a5)['quebec_pension_plan'] == alone['quebec_pension_plan'][0] == 0
+
+
+def test_invalid_batch_is_rejected_before_streaming():
+    records = [RECORD] * (service.STREAM_CHUNK + 5) + [dict(RECORD, remuneration=None)]
+    head, body = _serve(lambda port: _request(port, 'POST', '/batch', records))
+    assert head.startswith(b'HTTP/1.1 400')
+    assert 'remuneration' in json.loads(body)['error']
+
+
+def test_stream_error_ends_with_error_line():
+    records = [RECORD] * 3 + [dict(RECORD, pay_date='1990-01-01')]
+    head, body = _serve(lambda port: _request(port, 'POST', '/batch', records))
+    assert head.startswith(b'HTTP/1.1 200')
+    lines = [json.loads(line) for line in _dechunk(body).splitlines()]
+    assert 'error' in lines[-1]
+
+
+def test_malformed_request_line():
+    response = _serve(lambda port: _raw(port, b'GARBAGE\r\n\r\n'))
+    assert response.startswith(b'HTTP/1.1 400')
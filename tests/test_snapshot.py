@@ -0,0 +1,45 @@
+import os
+import shutil
+import subprocess
+import sys
+
+import rates
+import snapshot
+
+
+def _copy(tmp_path):
+    for name in os.listdir(rates.registry.directory):
+        if name.endswith('.json'):
+            shutil.copy(os.path.join(rates.registry.directory, name), tmp_path)
+    snapshot.build(rates.Registry(str(tmp_path), use_snapshot=False))
+    return str(tmp_path)
+
+
+def test_snapshot_gives_the_json_values(tmp_path):
+    directory = _copy(tmp_path)
+    for effective in rates.Registry(directory).effective_dates():
+        from_snapshot = rates.Registry(directory).get(effective).values
+        from_json = rates.Registry(directory, use_snapshot=False).get(effective).values
+        assert from_snapshot == from_json
+        assert dict((key, type(value)) for key, value in from_snapshot.items()) == \
+            dict((key, type(value)) for key, value in from_json.items())
+
+
+def test_stale_snapshot_is_ignored(tmp_path):
+    directory = _copy(tmp_path)
+    path = os.path.join(directory, snapshot.NAME)
+    name = sorted(name for name in os.listdir(directory) if name.endswith('.json'))[0]
+    # meme contenu, autre date de modification (clone, checkout): l'image reste bonne
+    os.utime(os.path.join(directory, name), ns=(0, 0))
+    assert snapshot.load(path, directory) is not None
+    with open(os.path.join(directory, name), 'a') as f:
+        f.write('\n')
+    assert snapshot.load(path, directory) is None
+
+
+def test_first_result_imports_neither_json_nor_logging():
+    code = ("import sys, objects; objects.IncomeTaxYear(I=50000, E=15532, pay_date='2020-01-03').calculate(); "
+            "print(sorted(set(('json', 'logging')) & set(sys.modules)))")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, '-c', code], cwd=root, capture_output=True, text=True, check=True).stdout
+    assert output.strip() == '[]'
@@ -0,0 +1,27 @@
+import pytest
+
+import ytd
+
+
+COLUMNS = {'remuneration': [1500, 2000], 'pay_periods': 52, 'remaining_periods': 52, 'E': 15532}
+
+
+def test_pay_date_is_recorded_once():
+    store = ytd.YearToDate()
+    store.pay_run(['a', 'b'], pay_date='2020-01-10', **COLUMNS)
+    paid = store.get('a', 2020)
+    with pytest.raises(ValueError):
+        store.pay_run(['a', 'b'], pay_date='2020-01-10', **COLUMNS)
+    assert store.get('a', 2020) == paid
+    store.pay_run(['a', 'b'], pay_date='2020-01-17', **COLUMNS)
+    assert store.get('a', 2020) == pytest.approx(tuple(2 * value for value in paid))
+
+
+def test_ledger_pay_date_is_recorded_once_per_job():
+    ledger = ytd.ContributionLedger()
+    ledger.pay_run(['w', 'w'], 'account', ['j1', 'j2'], pay_date='2020-01-10', **COLUMNS)
+    paid = ledger.get('w', 'account', 2020)
+    with pytest.raises(ValueError):
+        ledger.pay_run(['w'], 'account', ['j1'], pay_date='2020-01-10', remuneration=[1500], pay_periods=52,
+                       remaining_periods=52, E=15532)
+    assert ledger.get('w', 'account', 2020) == paid
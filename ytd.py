@@ -0,0 +1,304 @@
+import sqlite3
+
+import batch
+import rates
+
+
+# Cumulatifs de l'annee (A5, A6, assurance emploi) par employe, gardes dans un fichier SQLite.
+# A pay run reads what each employee paid so far, calculates the period and adds the new contributions
+# in one transaction, so caps are right without replaying the previous pay periods. Every pay date
+# recorded for an employee is kept: a pay run on a date already recorded is refused instead of being
+# added a second time.
+# ContributionLedger does the same for workers with several jobs and employer accounts in the bureau.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ytd (
+    employee_id TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    qpp REAL NOT NULL DEFAULT 0,
+    qpip REAL NOT NULL DEFAULT 0,
+    ei REAL NOT NULL DEFAULT 0,
+    last_pay_date TEXT,
+    PRIMARY KEY (employee_id, year)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS ytd_runs (
+    employee_id TEXT NOT NULL,
+    pay_date TEXT NOT NULL,
+    PRIMARY KEY (employee_id, pay_date)
+) WITHOUT ROWID;
+"""
+
+UPSERT = """
+INSERT INTO ytd (employee_id, year, qpp, qpip, ei, last_pay_date) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (employee_id, year) DO UPDATE SET
+    qpp = qpp + excluded.qpp,
+    qpip = qpip + excluded.qpip,
+    ei = ei + excluded.ei,
+    last_pay_date = excluded.last_pay_date
+"""
+
+# limite de variables par requete SQLite
+_SELECT_SIZE = 500
+
+
+class YearToDate():
+    """Year to date QPP (A5), QPIP (A6) and EI contributions per employee and year.
+    path = SQLite file, ':memory:' for a store that is not kept
+    """
+    def __init__(self, path=':memory:'):
+        self.path = path
+        self.connection = sqlite3.connect(path, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.executescript(SCHEMA)
+
+    def get(self, employee_id, year):
+        """(A5, A6, EI paid so far) for one employee, zeros if nothing was paid yet."""
+        row = self.connection.execute('SELECT qpp, qpip, ei FROM ytd WHERE employee_id = ? AND year = ?',
+                                      (str(employee_id), year)).fetchone()
+        if row is None:
+            return 0, 0, 0
+        return row
+
+    def get_many(self, employee_ids, year):
+        """A5, A6 and EI paid so far for a column of employees, returned as three lists."""
+        ids = [str(employee_id) for employee_id in employee_ids]
+        found = {}
+        for start in range(0, len(ids), _SELECT_SIZE):
+            part = ids[start:start + _SELECT_SIZE]
+            query = 'SELECT employee_id, qpp, qpip, ei FROM ytd WHERE year = ? AND employee_id IN (%s)' % ','.join('?' * len(part))
+            for employee_id, qpp, qpip, ei in self.connection.execute(query, [year] + part):
+                found[employee_id] = (qpp, qpip, ei)
+        totals = [found.get(employee_id, (0, 0, 0)) for employee_id in ids]
+        return [total[0] for total in totals], [total[1] for total in totals], [total[2] for total in totals]
+
+    def add_many(self, employee_ids, year, qpp, qpip, ei, pay_date=None):
+        """Adds one period of contributions to each employee, in a single transaction.
+        ValueError if a pay on pay_date is already recorded for one of the employees, nothing is added then.
+        """
+        pay_date = str(pay_date) if pay_date is not None else None
+        rows = [(str(employee_id), year, a, b, c, pay_date) for employee_id, a, b, c in zip(employee_ids, qpp, qpip, ei)]
+        with self.transaction():
+            if pay_date is not None:
+                _record_runs(self.connection, 'INSERT INTO ytd_runs (employee_id, pay_date) VALUES (?, ?)',
+                             [(row[0], pay_date) for row in rows], pay_date)
+            self.connection.executemany(UPSERT, rows)
+
+    def pay_run(self, employee_ids, pay_date=None, **columns):
+        """Calculates one pay period for the employees with their year to date totals and records it.
+        columns = the other arguments of batch.calculate_batch (remuneration, pay_periods, ...)
+        The read, calculation and update happen in one transaction: if anything fails nothing is recorded.
+        Running a pay date again raises ValueError (see add_many).
+        """
+        day = rates.to_date(pay_date)
+        with self.transaction():
+            A5, A6, ei_paid = self.get_many(employee_ids, day.year)
+            results = batch.calculate_batch(A5=A5, A6=A6, ei_paid=ei_paid, pay_date=pay_date, **columns)
+            self.add_many(employee_ids, day.year, results['quebec_pension_plan'], results['quebec_parental_insurance_plan'],
+                          results['employement_insurance'], day)
+        return results
+
+    def transaction(self):
+        return _Transaction(self.connection)
+
+    def close(self):
+        self.connection.close()
+
+
+LEDGER_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ledger (
+    worker_id TEXT NOT NULL,
+    account TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    qpp REAL NOT NULL DEFAULT 0,
+    qpip REAL NOT NULL DEFAULT 0,
+    ei REAL NOT NULL DEFAULT 0,
+    last_pay_date TEXT,
+    PRIMARY KEY (worker_id, account, year)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS ledger_jobs (
+    worker_id TEXT NOT NULL,
+    account TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    job_id TEXT NOT NULL,
+    qpp REAL NOT NULL DEFAULT 0,
+    qpip REAL NOT NULL DEFAULT 0,
+    ei REAL NOT NULL DEFAULT 0,
+    last_pay_date TEXT,
+    PRIMARY KEY (worker_id, account, year, job_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS ledger_runs (
+    worker_id TEXT NOT NULL,
+    account TEXT NOT NULL,
+    job_id TEXT NOT NULL,
+    pay_date TEXT NOT NULL,
+    PRIMARY KEY (worker_id, account, job_id, pay_date)
+) WITHOUT ROWID;
+"""
+
+LEDGER_UPSERT = """
+INSERT INTO ledger (worker_id, account, year, qpp, qpip, ei, last_pay_date) VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (worker_id, account, year) DO UPDATE SET
+    qpp = qpp + excluded.qpp,
+    qpip = qpip + excluded.qpip,
+    ei = ei + excluded.ei,
+    last_pay_date = excluded.last_pay_date
+"""
+
+JOB_UPSERT = """
+INSERT INTO ledger_jobs (worker_id, account, year, job_id, qpp, qpip, ei, last_pay_date) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (worker_id, account, year, job_id) DO UPDATE SET
+    qpp = qpp + excluded.qpp,
+    qpip = qpip + excluded.qpip,
+    ei = ei + excluded.ei,
+    last_pay_date = excluded.last_pay_date
+"""
+
+
+class ContributionLedger():
+    """Year to date contributions of workers paid in several jobs and for several employer accounts.
+    Each employer account withholds up to the maximums of QPP, QPIP and EI, so the jobs of a worker
+    under one account share A5, A6 and EI paid. The totals per (worker, account, year) are kept in
+    their own table and read by primary key, whatever the number of jobs; ledger_jobs keeps the detail.
+    path = SQLite file shared by the pay runs, ':memory:' for a ledger that is not kept
+    timeout = seconds to wait for another pay run holding the write lock
+    """
+    def __init__(self, path=':memory:', timeout=30):
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.executescript(LEDGER_SCHEMA)
+
+    def get(self, worker_id, account, year):
+        """(A5, A6, EI paid so far) of a worker for one employer account, zeros if nothing was paid yet."""
+        row = self.connection.execute('SELECT qpp, qpip, ei FROM ledger WHERE worker_id = ? AND account = ? AND year = ?',
+                                      (str(worker_id), str(account), year)).fetchone()
+        if row is None:
+            return 0, 0, 0
+        return row
+
+    def get_many(self, worker_ids, accounts, year):
+        """A5, A6 and EI paid so far for columns of workers and their employer accounts, as three lists."""
+        keys = list(zip((str(worker_id) for worker_id in worker_ids), (str(account) for account in _repeat(accounts, worker_ids))))
+        found = {}
+        size = _SELECT_SIZE // 2
+        for start in range(0, len(keys), size):
+            part = keys[start:start + size]
+            query = ('SELECT worker_id, account, qpp, qpip, ei FROM ledger WHERE year = ? AND (worker_id, account) IN (VALUES %s)'
+                     % ','.join(['(?, ?)'] * len(part)))
+            parameters = [year]
+            for key in part:
+                parameters.extend(key)
+            for worker_id, account, qpp, qpip, ei in self.connection.execute(query, parameters):
+                found[worker_id, account] = (qpp, qpip, ei)
+        totals = [found.get(key, (0, 0, 0)) for key in keys]
+        return [total[0] for total in totals], [total[1] for total in totals], [total[2] for total in totals]
+
+    def add_many(self, worker_ids, accounts, job_ids, year, qpp, qpip, ei, pay_date=None):
+        """Adds one period of contributions to each job and to the totals of its account, in a single transaction.
+        ValueError if a pay on pay_date is already recorded for one of the jobs, nothing is added then.
+        """
+        pay_date = str(pay_date) if pay_date is not None else None
+        rows = [(str(worker_id), str(account), year, str(job_id), a, b, c, pay_date)
+                for worker_id, account, job_id, a, b, c in zip(worker_ids, _repeat(accounts, worker_ids),
+                                                               _repeat(job_ids, worker_ids), qpp, qpip, ei)]
+        with self.transaction():
+            if pay_date is not None:
+                _record_runs(self.connection, 'INSERT INTO ledger_runs (worker_id, account, job_id, pay_date) VALUES (?, ?, ?, ?)',
+                             [row[:2] + (row[3], pay_date) for row in rows], pay_date)
+            self.connection.executemany(JOB_UPSERT, rows)
+            self.connection.executemany(LEDGER_UPSERT, [row[:3] + row[4:] for row in rows])
+
+    def worker(self, worker_id, year):
+        """Contributions of a worker per employer account and job: {account: {job_id: (qpp, qpip, ei)}}."""
+        jobs = {}
+        query = 'SELECT account, job_id, qpp, qpip, ei FROM ledger_jobs WHERE worker_id = ? AND year = ?'
+        for account, job_id, qpp, qpip, ei in self.connection.execute(query, (str(worker_id), year)):
+            jobs.setdefault(account, {})[job_id] = (qpp, qpip, ei)
+        return jobs
+
+    def pay_run(self, worker_ids, accounts, job_ids, pay_date=None, **columns):
+        """Calculates one pay period for the jobs with the totals of their employer account and records it.
+        worker_ids, accounts, job_ids = one value per job paid, accounts or job_ids can be a single value
+        columns = the other arguments of batch.calculate_batch (remuneration, pay_periods, ...)
+        A worker with more than one job under an account in this run has them calculated one after the
+        other, each with what the previous ones withheld, so the maximums are never exceeded.
+        The whole run is one transaction: pay runs in parallel on the same ledger wait for each other.
+        Running a pay date again for a job raises ValueError (see add_many).
+        """
+        day = rates.to_date(pay_date)
+        year = day.year
+        keys = list(zip((str(worker_id) for worker_id in worker_ids), (str(account) for account in _repeat(accounts, worker_ids))))
+        # vague k: la k-ieme paie de chaque (travailleur, compte) dans ce lot
+        seen = {}
+        waves = []
+        for i, key in enumerate(keys):
+            wave = seen.get(key, 0)
+            seen[key] = wave + 1
+            if wave == len(waves):
+                waves.append([])
+            waves[wave].append(i)
+
+        results = dict((name, [None] * len(keys)) for name in batch.OUTPUTS)
+        jobs = list(_repeat(job_ids, worker_ids))
+        with self.transaction():
+            for rows in waves:
+                ids = [keys[i][0] for i in rows]
+                wave_accounts = [keys[i][1] for i in rows]
+                A5, A6, ei_paid = self.get_many(ids, wave_accounts, year)
+                wave = batch.calculate_batch(A5=A5, A6=A6, ei_paid=ei_paid, pay_date=pay_date,
+                                             **dict((name, _take(value, rows)) for name, value in columns.items()))
+                self.add_many(ids, wave_accounts, [jobs[i] for i in rows], year, wave['quebec_pension_plan'],
+                              wave['quebec_parental_insurance_plan'], wave['employement_insurance'], day)
+                for name in batch.OUTPUTS:
+                    column = results[name]
+                    for i, value in zip(rows, wave[name]):
+                        column[i] = value
+        return results
+
+    def transaction(self):
+        return _Transaction(self.connection)
+
+    def close(self):
+        self.connection.close()
+
+
+def _record_runs(connection, insert, rows, pay_date):
+    # une paie par cle et par date: la cle primaire refuse une paie deja enregistree
+    try:
+        connection.executemany(insert, rows)
+    except sqlite3.IntegrityError:
+        raise ValueError('a pay on %s is already recorded' % pay_date) from None
+
+
+def _repeat(value, like):
+    # une seule valeur (un compte employeur pour tout le lot) ou une colonne
+    if isinstance(value, (int, str)):
+        return [value] * len(like)
+    return value
+
+
+def _take(value, indexes):
+    if value is None or isinstance(value, (int, float, str)) or not hasattr(value, '__getitem__'):
+        return value
+    return [value[i] for i in indexes]
+
+
+class _Transaction():
+    # BEGIN IMMEDIATE ... COMMIT, ROLLBACK sur exception. Nested use joins the outer transaction.
+    def __init__(self, connection):
+        self.connection = connection
+        self.outer = False
+
+    def __enter__(self):
+        self.outer = not self.connection.in_transaction
+        if self.outer:
+            self.connection.execute('BEGIN IMMEDIATE')
+        return self.connection
+
+    def __exit__(self, kind, value, traceback):
+        if self.outer:
+            if kind is None:
+                self.connection.execute('COMMIT')
+            else:
+                self.connection.execute('ROLLBACK')
+        return False